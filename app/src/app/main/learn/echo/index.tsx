@@ -35,7 +35,7 @@ import { useEchoMutation, useEchoResultQuery, useEchoTranscriptsQuery } from "~/
 import type { Transcript } from "~/client/models";
 import { Spinner, Text } from "~/components";
 import { useNavigationOptions } from "~/hooks";
-import { getLocalFileBase64 } from "~/utils";
+import { resolveAudioUri } from "~/utils";
 
 const RECORDING_DURATION_THRESHOLD = 1500; // ms
 
@@ -158,6 +158,8 @@ export default function MainLearnEchoScreen() {
 
   const { reset: resetMutation, ...mutation } = useEchoMutation(transcript?.id);
   const { data: result, ...queryResult } = useEchoResultQuery(mutation.isSuccess ? transcript?.id : undefined);
+  // the pronunciation is shown as soon as it is scored, the attempt is over once the feedback follows
+  const analyzed = queryResult.isSuccess && (result === null || !!result.feedback);
 
   const handleNext = () => {
     if (progress < transcripts!.items.length - 1) {
@@ -171,7 +173,7 @@ export default function MainLearnEchoScreen() {
   };
 
   const handleProgress = () => {
-    if (queryResult.isSuccess) {
+    if (analyzed) {
       handleNext();
     } else {
       Alert.alert("Relinquish", "Are you sure you want to relinquish this attempt?", [
@@ -188,12 +190,12 @@ export default function MainLearnEchoScreen() {
   useNavigationOptions({
     header: () => (
       <Header
-        attempted={queryResult.isSuccess}
+        attempted={analyzed}
         transcript={transcript}
         progress={progress}
         onProgress={handleProgress}
         disableProgress={
-          queryTranscripts.isFetching || mutation.isPending || queryResult.isLoading || recorderState.isRecording
+          queryTranscripts.isFetching || mutation.isPending || queryResult.isFetching || recorderState.isRecording
         }
       />
     ),
@@ -201,20 +203,20 @@ export default function MainLearnEchoScreen() {
 
   // handle result once available
   useEffect(() => {
-    if (queryResult.isSuccess) {
+    if (analyzed) {
       if (result === null) {
         resetMutation();
         Alert.alert("Speak Up!", "We couldn't hear you. Try to speak louder and clearer.");
       } else {
-        // player.replace(result!.feedback.audio);
+        // player.replace(result!.feedback!.audio);
         // player.seekTo(0);
         // player.play();
       }
     }
-  }, [router, player, transcript, result, queryResult.isSuccess, resetMutation]);
+  }, [router, player, transcript, result, analyzed, resetMutation]);
 
   const handlePronounce = () => {
-    player.replace(transcript!.audio);
+    player.replace(resolveAudioUri(transcript!.audio));
     player.seekTo(0);
     player.play();
   };
@@ -241,8 +243,7 @@ export default function MainLearnEchoScreen() {
       });
     }
     if (recorder.uri && duration >= RECORDING_DURATION_THRESHOLD) {
-      const audio = await getLocalFileBase64(recorder.uri);
-      mutation.mutate(audio, { onError: (error) => Alert.alert(error.message) });
+      mutation.mutate(recorder.uri, { onError: (error) => Alert.alert(error.message) });
     }
   };
 
@@ -261,8 +262,9 @@ export default function MainLearnEchoScreen() {
   const transcriptCard = [transcript?.text, transcript?.sequence.replaceAll("/", "")];
 
   const resultCard = [
-    result?.pronunciation.words.map(([word, alignments], key) => {
-      const score = alignments.reduce((a, b) => a + b.score, 0) / alignments.length;
+    result?.pronunciation.words.map(([word, start, end], key) => {
+      const scores = result.pronunciation.scores.slice(start, end);
+      const score = scores.reduce((a, b) => a + b, 0) / scores.length;
       const color = getScoringColor(score * 100);
       return (
         <Text key={key} style={{ color, fontFamily: "" }}>
@@ -270,19 +272,22 @@ export default function MainLearnEchoScreen() {
         </Text>
       );
     }),
-    result?.pronunciation.words.map(([, alignments]) =>
-      alignments.map(({ score, token }, key) => (
-        <Text key={key} style={{ color: getScoringColor(score * 100), fontFamily: "" }}>
-          {token}
-          {key + 1 === alignments.length ? " " : null}
-        </Text>
-      )),
+    result?.pronunciation.words.map(([, start, end]) =>
+      result.pronunciation.tokens.slice(start, end).map((token, key) => {
+        const color = getScoringColor(result.pronunciation.scores[start + key] * 100);
+        return (
+          <Text key={key} style={{ color, fontFamily: "" }}>
+            {token}
+            {start + key + 1 === end ? " " : null}
+          </Text>
+        );
+      }),
     ),
   ];
 
   const score = useMemo(() => {
     if (!result) return undefined;
-    const scores = result.pronunciation.alignments.map((a) => a.score);
+    const scores = result.pronunciation.scores;
     const total = scores.reduce((a, b) => a + b, 0);
     const percentage = Math.round((total / scores.length) * 100);
     const color = getScoringColor(percentage);
@@ -403,7 +408,14 @@ export default function MainLearnEchoScreen() {
             alwaysBounceVertical={false}
             style={tw`max-h-52 rounded-2xl border-2 border-zinc-500/50`}
             contentContainerStyle={tw`p-4`}>
-            <Text style={tw`text-lg`}>{result?.feedback.text}</Text>
+            {result.feedback ? (
+              <Text style={tw`text-lg`}>{result.feedback.text}</Text>
+            ) : (
+              <View style={tw`flex-row items-center gap-2`}>
+                <Spinner />
+                <Text style={tw`font-medium text-neutral-500`}>Writing your feedback...</Text>
+              </View>
+            )}
           </ScrollView>
         </View>
       )}
@@ -3,10 +3,12 @@ import axios, { AxiosError } from "axios";
 import { useSetAtom } from "jotai";
 
 import store, { $token } from "../store";
-import type { Result, Transcripts, User } from "./models";
+import type { EchoEvent, PartialResult, Result, Transcripts, User } from "./models";
 
 const API_URL = process.env.EXPO_PUBLIC_API_URL;
 
+const AUDIO_TYPES: Record<string, string> = { wav: "audio/wav", aac: "audio/aac", m4a: "audio/mp4" };
+
 const client = axios.create({
   baseURL: API_URL,
   responseType: "json",
@@ -95,23 +97,86 @@ export const useEchoTranscriptsQuery = () =>
 
 export const useEchoMutation = (tid?: string) =>
   useMutation<void, AxiosError, string>({
-    mutationFn: async (audio: string) => {
+    mutationFn: async (uri: string) => {
       if (!tid) return;
-      await client.post<void>(`/echo/${tid}`, { audio });
+      // upload the recording as is rather than as base64 in JSON, React Native reads the file itself
+      const extension = uri.split(".").pop() ?? "";
+      const form = new FormData();
+      form.append("audio", { uri, name: `echo.${extension}`, type: AUDIO_TYPES[extension] ?? "audio/*" } as any);
+      await client.post<void>(`/echo/${tid}`, form, { headers: { "Content-Type": "multipart/form-data" } });
     },
   });
 
+// Streams the stages of an analysis until it is finished, resolving with the last one. React Native has no
+// `EventSource`, its `XMLHttpRequest` exposes the response as it arrives instead.
+const streamEchoEvents = (tid: string, onEvent: (event: EchoEvent) => void, signal: AbortSignal) =>
+  new Promise<EchoEvent | undefined>((resolve, reject) => {
+    const xhr = new XMLHttpRequest();
+    let offset = 0;
+    let last: EchoEvent | undefined;
+
+    // events are separated by blank lines, heartbeats are comments without data
+    const parse = () => {
+      let end: number;
+      while ((end = xhr.responseText.indexOf("\n\n", offset)) !== -1) {
+        const data = xhr.responseText
+          .slice(offset, end)
+          .split("\n")
+          .filter((line) => line.startsWith("data:"))
+          .map((line) => line.slice(5).trim())
+          .join("\n");
+        offset = end + 2;
+        if (data) onEvent((last = JSON.parse(data)));
+      }
+    };
+
+    xhr.onreadystatechange = () => {
+      if (xhr.readyState < XMLHttpRequest.LOADING || xhr.status !== 200) return;
+      parse();
+      if (xhr.readyState === XMLHttpRequest.DONE) resolve(last);
+    };
+    xhr.onloadend = () => reject(new Error(`Event stream failed: ${xhr.status}`)); // no-op once resolved
+    signal.addEventListener("abort", () => xhr.abort());
+
+    xhr.open("GET", `${API_URL}/echo/${tid}/events`);
+    const token = store.get($token);
+    if (token) xhr.setRequestHeader("Authorization", `Bearer ${token}`);
+    xhr.setRequestHeader("Accept", "text/event-stream");
+    xhr.send();
+  });
+
 export const useEchoResultQuery = (tid?: string) =>
-  useQuery<Result | null, AxiosError>({
+  useQuery<PartialResult | null, AxiosError>({
     queryKey: ["echo", tid, "result"],
-    queryFn: async ({ client: qclient }) => {
+    queryFn: async ({ client: qclient, queryKey, signal }) => {
+      try {
+        // show the pronunciation right away, the feedback follows once generated
+        const last = await streamEchoEvents(
+          tid!,
+          (event) => {
+            if (event.pronunciation) {
+              qclient.setQueryData<PartialResult>(queryKey, { pronunciation: event.pronunciation });
+            }
+          },
+          signal,
+        );
+        if (last?.status === "done") {
+          if (last.result === null) qclient.removeQueries({ queryKey });
+          return last.result;
+        }
+      } catch (error) {
+        if (signal.aborted) throw error;
+        console.warn(error);
+      }
+      // either the stream broke off or the analysis failed, the result endpoint reports both
       while (true) {
         const { status, data } = await client.get<Result | null>(`/echo/${tid}/result`, {
           validateStatus: (status) => [200, 204, 425].includes(status),
+          signal,
         });
         if (status !== 425) {
           if (status === 204) {
-            qclient.removeQueries({ queryKey: ["echo", tid, "result"] });
+            qclient.removeQueries({ queryKey });
             return null;
           }
           return data;
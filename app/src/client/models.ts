@@ -17,20 +17,33 @@ export type Transcripts = {
   items: Transcript[];
 };
 
-type Alignment = {
-  token: string;
-  score: number;
-  interval: [number, number];
+export type Feedback = {
+  text: string;
+  audio: string;
+};
+
+export type Pronunciation = {
+  phonemes: string[];
+  // parallel arrays over the transcript's phonemes
+  tokens: string[];
+  scores: number[];
+  intervals: [number, number][];
+  // offsets into the arrays above
+  words: [string, number, number][];
 };
 
 export type Result = {
-  feedback: {
-    text: string;
-    audio: string;
-  };
-  pronunciation: {
-    phonemes: string[];
-    alignments: Alignment[];
-    words: [string, Alignment[]][];
-  };
+  feedback: Feedback;
+  pronunciation: Pronunciation;
+};
+
+// a result as it comes in: the pronunciation first, the feedback once generated
+export type PartialResult = Pick<Result, "pronunciation"> & Partial<Pick<Result, "feedback">>;
+
+// every stage of an analysis, pushed by `/echo/{tid}/events`
+export type EchoEvent = {
+  status: "pending" | "processing" | "pronounced" | "done" | "error";
+  error: "audio_too_long" | "busy" | null;
+  pronunciation: Pronunciation | null; // only while `pronounced`
+  result: Result | null; // only once `done`, unless nothing could be heard
 };
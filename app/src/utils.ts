@@ -1,12 +1,3 @@
-import axios from "axios";
-
-export const getLocalFileBase64 = async (uri: string): Promise<string> => {
-  const { data } = await axios.get<ArrayBuffer>(uri, {
-    responseType: "arraybuffer",
-    responseEncoding: "binary",
-  });
-  const encodeArrayBufferBase64 = (buffer: ArrayBuffer): string => {
-    return btoa(new Uint8Array(buffer).reduce((data, byte) => data + String.fromCharCode(byte), ""));
-  };
-  return encodeArrayBufferBase64(data);
-};
+// audio may be served by the API (relative URL) or inlined (data URL)
+export const resolveAudioUri = (audio: string): string =>
+  audio.startsWith("/") ? `${process.env.EXPO_PUBLIC_API_URL}${audio}` : audio;
@@ -0,0 +1,111 @@
+"""
+Login throughput against the latency of an unrelated endpoint while logins are hammered,
+with Argon2 run inline on the event loop versus on the bounded hasher pool.
+
+    uv run python -m benchmarks.auth --logins 32 --seconds 5
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+from argon2 import PasswordHasher
+from argon2.exceptions import VerifyMismatchError
+from fastapi import FastAPI, HTTPException, Response, status
+
+from server.repository.hasher import AsyncPasswordHasher, HasherSaturatedError
+
+PASSWORD = "correct horse battery staple"
+
+
+def create_app(offload: bool) -> FastAPI:
+    app = FastAPI()
+    inline = PasswordHasher()
+    hasher = AsyncPasswordHasher()
+    hash = inline.hash(PASSWORD)
+
+    @app.post("/login")
+    async def login():
+        if not offload:
+            try:
+                return inline.verify(hash, PASSWORD)
+            except VerifyMismatchError:
+                return False
+        try:
+            return await hasher.verify(hash, PASSWORD)
+        except HasherSaturatedError:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, headers={"Retry-After": "1"})
+
+    @app.get("/ping")
+    async def ping():
+        return Response()
+
+    return app
+
+
+async def run(offload: bool, logins: int, seconds: float) -> dict[str, float]:
+    transport = httpx.ASGITransport(app=create_app(offload))
+    deadline = time.perf_counter() + seconds
+    accepted = rejected = 0
+    latencies: list[float] = []
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+
+        async def log_in():
+            nonlocal accepted, rejected
+            while time.perf_counter() < deadline:
+                response = await client.post("/login")
+                if response.status_code == status.HTTP_200_OK:
+                    accepted += 1
+                else:
+                    rejected += 1
+                    await asyncio.sleep(0.01)  # a client honoring `Retry-After` would back off even longer
+
+        async def poll():
+            # measured from when the ping was due, so that time spent waiting on a blocked loop counts
+            due = time.perf_counter() + 0.1  # let logins pile up first
+            while True:
+                await asyncio.sleep(max(0.0, due - time.perf_counter()))
+                await client.get("/ping")
+                latencies.append((time.perf_counter() - due) * 1000)
+                if done.is_set():
+                    break
+                due = time.perf_counter() + 0.01
+
+        async def log_in_all():
+            await asyncio.gather(*[log_in() for _ in range(logins)])
+            done.set()
+
+        done = asyncio.Event()
+        await asyncio.gather(poll(), log_in_all())
+
+    latencies.sort()
+    return {
+        "logins/s": accepted / seconds,
+        "rejected/s": rejected / seconds,
+        "p50 ms": statistics.median(latencies),
+        "p99 ms": latencies[int(len(latencies) * 0.99)],
+        "pings": len(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=32, help="concurrent login clients")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(f"{'mode':>8} {'logins/s':>9} {'rejected/s':>11} {'pings':>6} {'ping p50 ms':>12} {'ping p99 ms':>12}")
+    for offload in (False, True):
+        stats = asyncio.run(run(offload, args.logins, args.seconds))
+        mode = "pool" if offload else "inline"
+        print(
+            f"{mode:>8} {stats['logins/s']:>9.1f} {stats['rejected/s']:>11.1f} {stats['pings']:>6}"
+            f" {stats['p50 ms']:>12.2f} {stats['p99 ms']:>12.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
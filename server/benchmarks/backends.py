@@ -0,0 +1,69 @@
+"""
+Accuracy parity and latency of the aligner inference backends against the fp32 PyTorch reference.
+
+    uv run python -m benchmarks.backends --sample recording.wav "What kind of dessert do you think they'd love?"
+
+Without samples, synthetic noise is aligned against a fixed sentence, which only checks numerical parity.
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import torch
+
+from server.core.generators.transcript import Transcript, phonemize_texts
+from server.core.levenshtein import levenshtein
+from server.core.pipeline.aligner import CONFIDENCE_THRESHOLD, Pronunciation, PronunciationAligner
+from server.core.pipeline.processor import AudioProcessor
+from server.core.registry import registry
+
+BACKENDS = ["torch", "int8", "onnx"]
+TEXT = "How much longer do you think the potatoes will take to bake in the oven?"
+
+
+def load_samples(samples: list[list[str]]) -> list[tuple[torch.Tensor, Transcript]]:
+    processor = AudioProcessor(use_df=False)
+    texts = [text for _, text in samples] or [TEXT] * 4
+    sequences = phonemize_texts(texts)
+    transcripts = [Transcript(text=text, sequence=sequence, audio="") for text, sequence in zip(texts, sequences)]
+    if not samples:
+        torch.manual_seed(0)
+        return [(torch.randn(AudioProcessor.SR * 4) * 0.1, transcript) for transcript in transcripts]
+    return [(processor(Path(path).read_bytes()), transcript) for (path, _), transcript in zip(samples, transcripts)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sample", nargs=2, action="append", default=[], metavar=("WAV", "TEXT"))
+    parser.add_argument("--backends", nargs="+", default=BACKENDS, choices=BACKENDS)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    samples = load_samples(args.sample)
+    results: dict[str, list[Pronunciation]] = {}
+    print(f"{'backend':>8} {'ms/clip':>8} {'MB':>8} {'PER':>6} {'max Δscore':>10} {'flips':>6}")
+    for backend in ["torch", *[b for b in args.backends if b != "torch"]]:
+        aligner = PronunciationAligner(backend=backend)
+        aligner(*samples[0])  # load and warm up
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            results[backend] = [aligner(waveform, transcript) for waveform, transcript in samples]
+        latency = (time.perf_counter() - start) / args.repeat / len(samples) * 1000
+        size = (registry.stats()[f"wav2vec2:{backend}"]["parameter_bytes"] or 0) / 2**20
+
+        errors = phonemes = flips = 0
+        delta = 0.0
+        for reference, candidate in zip(results["torch"], results[backend]):
+            _, _, operations = levenshtein(reference.phonemes, candidate.phonemes)
+            errors += len(operations)
+            phonemes += len(reference.phonemes)
+            for a, b in zip(reference.scores, candidate.scores):
+                delta = max(delta, abs(a - b))
+                flips += (a >= CONFIDENCE_THRESHOLD) != (b >= CONFIDENCE_THRESHOLD)
+        per = errors / max(phonemes, 1)
+        print(f"{backend:>8} {latency:>8.1f} {size:>8.1f} {per:>6.3f} {delta:>10.4f} {flips:>6}")
+
+
+if __name__ == "__main__":
+    main()
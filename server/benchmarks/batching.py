@@ -0,0 +1,46 @@
+"""
+Throughput of wav2vec2 phoneme inference against the micro-batch size.
+
+    uv run python -m benchmarks.batching --clips 32 --batch-sizes 1 2 4 8
+"""
+
+import argparse
+import time
+
+import torch
+
+from server.core.pipeline.aligner import PronunciationAligner
+from server.core.pipeline.processor import AudioProcessor
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clips", type=int, default=32)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--min-seconds", type=float, default=2.0)
+    parser.add_argument("--max-seconds", type=float, default=6.0)
+    parser.add_argument("--threads", type=int, default=torch.get_num_threads())
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    torch.set_num_threads(args.threads)
+    aligner = PronunciationAligner()
+
+    durations = torch.empty(args.clips).uniform_(args.min_seconds, args.max_seconds)
+    waveforms = [torch.randn(int(d * AudioProcessor.SR)) * 0.1 for d in durations]
+    aligner.perform_batch_inference(waveforms[:1])  # warm-up
+
+    print(f"{'batch':>5} {'seconds':>8} {'clips/s':>8} {'speedup':>8}")
+    baseline = None
+    for batch_size in args.batch_sizes:
+        start = time.perf_counter()
+        for i in range(0, len(waveforms), batch_size):
+            aligner.perform_batch_inference(waveforms[i : i + batch_size])
+        elapsed = time.perf_counter() - start
+        throughput = len(waveforms) / elapsed
+        baseline = baseline or throughput
+        print(f"{batch_size:>5} {elapsed:>8.2f} {throughput:>8.2f} {throughput / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Peak memory and latency of wav2vec2 inference against the clip length, in a single pass versus in windows,
+with how closely the stitched logits match the single pass. Every run is measured in a fresh process.
+
+    uv run python -m benchmarks.chunking --seconds 5 10 20 40 80 --chunk-seconds 10
+"""
+
+import argparse
+import multiprocessing
+import resource
+import time
+
+import torch
+
+from server.core.pipeline.aligner import PronunciationAligner
+from server.core.pipeline.processor import AudioProcessor
+
+
+def waveform(seconds: float) -> torch.Tensor:
+    torch.manual_seed(0)
+    return torch.randn(int(seconds * AudioProcessor.SR)) * 0.1
+
+
+def measure(seconds: float, chunk_seconds: float, overlap_seconds: float, queue: multiprocessing.Queue):
+    aligner = PronunciationAligner(chunk_seconds=chunk_seconds, chunk_overlap_seconds=overlap_seconds)
+    aligner.perform_inference(waveform(1.0))  # load and warm up
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    logits = aligner.perform_inference(waveform(seconds))
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline  # KiB on Linux
+    queue.put((elapsed, peak / 1024, logits.log_softmax(dim=-1)))
+
+
+def run(*args) -> tuple[float, float, torch.Tensor]:
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=measure, args=(*args, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, nargs="+", default=[5, 10, 20, 40, 80])
+    parser.add_argument("--chunk-seconds", type=float, default=10.0)
+    parser.add_argument("--overlap-seconds", type=float, default=2.0)
+    args = parser.parse_args()
+
+    header = f"{'seconds':>7} {'full s':>7} {'full MB':>8} {'chunked s':>10} {'chunked MB':>11}"
+    print(f"{header} {'max Δlogp':>10} {'argmax':>7}")
+    for seconds in args.seconds:
+        full_time, full_peak, full = run(seconds, seconds + 1, args.overlap_seconds)  # never chunked
+        time_, peak, chunked = run(seconds, args.chunk_seconds, args.overlap_seconds)
+        delta = (full - chunked).abs().max().item()
+        agreement = (full.argmax(dim=-1) == chunked.argmax(dim=-1)).float().mean().item()
+        print(
+            f"{seconds:>7.0f} {full_time:>7.2f} {full_peak:>8.0f} {time_:>10.2f} {peak:>11.0f}"
+            f" {delta:>10.3f} {agreement:>7.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Per-stage timings of the audio front-end, and the cached resampler and energy trim
+against `torchaudio.functional.resample` and `torchaudio.functional.vad`.
+
+    uv run python -m benchmarks.frontend --rates 16000 44100 48000 --seconds 5 --repeat 20
+"""
+
+import argparse
+import io
+import time
+
+import soundfile
+import torch
+import torchaudio
+
+from server.core.pipeline.processor import AudioProcessor, resample, trim
+
+
+def recording(sr: int, seconds: float) -> bytes:
+    """Noise floor with a burst of louder noise in the middle, standing in for speech."""
+    torch.manual_seed(0)
+    waveform = torch.randn(int(sr * seconds)) * 1e-3
+    waveform[int(sr * seconds / 4) : int(sr * seconds * 3 / 4)] *= 100
+    buffer = io.BytesIO()
+    soundfile.write(buffer, waveform.numpy(), samplerate=sr, format="wav")
+    return buffer.getvalue()
+
+
+def timeit(f, repeat: int) -> float:
+    f()  # warm-up, e.g. the resampling kernel
+    start = time.perf_counter()
+    for _ in range(repeat):
+        f()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rates", type=int, nargs="+", default=[16_000, 44_100, 48_000])
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--no-df", action="store_true", help="skip DeepFilterNet")
+    args = parser.parse_args()
+
+    print(f"{'rate':>6} {'resample ms':>12} {'cached ms':>10} {'vad ms':>8} {'trim ms':>8}")
+    for sr in args.rates:
+        waveform, _ = torchaudio.load(io.BytesIO(recording(sr, args.seconds)))
+        speech = resample(waveform, sr, AudioProcessor.SR)
+        times = [
+            timeit(lambda w=waveform, sr=sr: torchaudio.functional.resample(w, sr, AudioProcessor.SR), args.repeat),
+            timeit(lambda w=waveform, sr=sr: resample(w, sr, AudioProcessor.SR), args.repeat),
+            timeit(lambda s=speech: torchaudio.functional.vad(s, AudioProcessor.SR), args.repeat),
+            timeit(lambda s=speech: trim(s, AudioProcessor.SR), args.repeat),
+        ]
+        print(f"{sr:>6} " + " ".join(f"{t:>{w}.2f}" for t, w in zip(times, [12, 10, 8, 8])))
+
+    print()
+    print(f"{'rate':>6} " + " ".join(f"{stage + ' ms':>12}" for stage in AudioProcessor.STAGES) + f" {'kept s':>7}")
+    for sr in args.rates:
+        data = recording(sr, args.seconds)
+        processor = AudioProcessor(use_df=not args.no_df)
+        processor(data)  # warm-up, loads DeepFilterNet
+        processor = AudioProcessor(use_df=not args.no_df)
+        for _ in range(args.repeat):
+            kept = processor(data)
+        stats = processor.stats()
+        seconds = 0.0 if kept is None else kept.shape[-1] / AudioProcessor.SR
+        timings = " ".join(f"{stats[stage + '_ms']:>12.2f}" for stage in AudioProcessor.STAGES)
+        print(f"{sr:>6} {timings} {seconds:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
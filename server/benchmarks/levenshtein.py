@@ -0,0 +1,61 @@
+"""
+Times the vectorized Levenshtein engine, exact and banded, against the original pure-Python implementation
+across sequence lengths. Their outputs are compared by `tests/test_levenshtein.py`.
+
+    uv run python -m benchmarks.levenshtein --lengths 10 50 200 1000
+"""
+
+import argparse
+import random
+import time
+
+from server.core.levenshtein import levenshtein
+from tests.test_levenshtein import reference
+
+PHONEMES = "p b t d k ɡ f v θ ð s z ʃ ʒ h m n ŋ l ɹ w j i ɪ e ɛ æ ə ʌ ɑ ɔ ʊ u aɪ aʊ oʊ eɪ ɔɪ ɚ".split()
+
+
+def mutate(sequence: list[str], rate: float) -> list[str]:
+    """A noisy copy of the sequence, as a learner's pronunciation of a transcript."""
+    output = []
+    for phoneme in sequence:
+        r = random.random()
+        if r < rate / 3:
+            continue  # deletion
+        output.append(random.choice(PHONEMES) if r < rate * 2 / 3 else phoneme)
+        if random.random() < rate / 3:
+            output.append(random.choice(PHONEMES))  # insertion
+    return output
+
+
+def timeit(f, *args, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        f(*args)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lengths", type=int, nargs="+", default=[10, 30, 60, 200, 1000])
+    parser.add_argument("--band", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+
+    print(f"{'length':>6} {'reference':>10} {'numpy':>10} {'banded':>10}  (ms)")
+    for length in args.lengths:
+        s1 = random.choices(PHONEMES, k=length)
+        s2 = mutate(s1, 0.2)
+        repeat = max(1, 2000 // length)
+        times = [
+            timeit(reference, s1, s2, repeat=max(1, repeat // 10)),
+            timeit(levenshtein, s1, s2, repeat=repeat),
+            timeit(levenshtein, s1, s2, args.band, repeat=repeat),
+        ]
+        print(f"{length:>6} " + " ".join(f"{t:>10.3f}" for t in times))
+
+
+if __name__ == "__main__":
+    main()
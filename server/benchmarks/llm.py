@@ -0,0 +1,160 @@
+"""
+Load test of the generator path against an in-process OpenAI-compatible stub of the model runner,
+for several gateway concurrency limits. The stub shares a fixed token throughput between the requests
+it is serving, like a local llama instance, and sometimes answers with malformed transcripts.
+
+    uv run python -m benchmarks.llm --requests 64 --concurrency 1 4 64
+    uv run python -m benchmarks.llm --serve 8001  # then LLM_BASE_URL=http://localhost:8001/v1
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from server.core.generators import GenerationError, Generator, LLMGateway
+from server.core.generators.transcript import TranscriptGenerator
+
+TRANSCRIPTS = """+ You are ordering lunch at a busy food truck.
+- Could I get the spicy chicken wrap with no onions, please?
+- How long is the wait right now?
+- Wow, everything on this menu looks absolutely delicious!
+- I think I'll grab a lemonade to go with it.
+- Do you take cards, or is it cash only today?"""
+
+FEEDBACK = "Nice work overall! Focus on the vowel in the second word and keep practicing."
+
+
+def create_stub(token_ms: float, invalid_rate: float) -> FastAPI:
+    app = FastAPI()
+    active = 0
+
+    async def tokens(text: str):
+        nonlocal active
+        active += 1
+        try:
+            for token in text.split(" "):
+                await asyncio.sleep(token_ms / 1000 * active)  # throughput is shared by every request
+                yield token + " "
+        finally:
+            active -= 1
+
+    def chunk(content: str | None, finish: str | None = None) -> str:
+        delta = {"content": content} if content is not None else {}
+        data = {
+            "id": "stub",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": "stub",
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+        }
+        return f"data: {json.dumps(data)}\n\n"
+
+    @app.post("/{path:path}")
+    async def completions(path: str, request: Request):
+        body = await request.json()
+        prompt = body["messages"][-1]["content"]
+        text = TRANSCRIPTS if prompt.startswith("Topic:") else FEEDBACK
+        if prompt.startswith("Topic:") and random.random() < invalid_rate:
+            text = "\n".join(text.splitlines()[:3])  # truncated output
+        if body.get("stream"):
+
+            async def events():
+                async for token in tokens(text):
+                    yield chunk(token)
+                yield chunk(None, finish="stop")
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(events(), media_type="text/event-stream")
+        message = {"role": "assistant", "content": "".join([token async for token in tokens(text)])}
+        return JSONResponse(
+            {
+                "id": "stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": "stub",
+                "choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+            }
+        )
+
+    return app
+
+
+class StubGenerator(TranscriptGenerator):
+    async def __call__(self, topic: str | None = None) -> tuple[str, list[str]]:  # type: ignore[override]
+        # the LLM part of `TranscriptGenerator`, without phonemization and speech synthesis
+        return await Generator.__call__(self, f"Topic: {topic}", parse=TranscriptGenerator.parse)
+
+
+async def run(concurrency: int, requests: int, stub: FastAPI) -> dict[str, float]:
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=stub), base_url="http://stub")
+    gateway = LLMGateway("stub", max_concurrency=concurrency, queue_timeout=3600, http_client=client)
+    generator = StubGenerator(gateway=gateway)
+    latencies: list[float] = []
+    failed = 0
+
+    async def request():
+        nonlocal failed
+        start = time.perf_counter()
+        try:
+            await generator("food")
+        except GenerationError:
+            failed += 1
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[request() for _ in range(requests)])
+    elapsed = time.perf_counter() - start
+
+    # time to first token while the gateway is idle
+    first = time.perf_counter()
+    async for _ in generator.stream("How did I do?"):
+        first = time.perf_counter() - first
+        break
+    await gateway.aclose()
+
+    latencies.sort()
+    stats = gateway.stats()
+    return {
+        "req/s": requests / elapsed,
+        "p50 s": latencies[len(latencies) // 2],
+        "p99 s": latencies[int(len(latencies) * 0.99)],
+        "attempts": stats["requests"] / (requests + 1),
+        "queue ms": stats["avg_queue_ms"],
+        "latency ms": stats["avg_latency_ms"],
+        "failed": failed,
+        "ttft ms": first * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 64])
+    parser.add_argument("--token-ms", type=float, default=2.0, help="time per token with a single request")
+    parser.add_argument("--invalid-rate", type=float, default=0.2)
+    parser.add_argument("--serve", type=int, metavar="PORT", help="serve the stub over HTTP instead")
+    args = parser.parse_args()
+
+    stub = create_stub(args.token_ms, args.invalid_rate)
+    if args.serve:
+        import uvicorn
+
+        uvicorn.run(stub, port=args.serve)
+        return
+
+    random.seed(0)
+    columns = ["req/s", "p50 s", "p99 s", "attempts", "queue ms", "latency ms", "failed", "ttft ms"]
+    print(f"{'limit':>5} " + " ".join(f"{c:>10}" for c in columns))
+    for concurrency in args.concurrency:
+        stats = asyncio.run(run(concurrency, args.requests, stub))
+        print(f"{concurrency:>5} " + " ".join(f"{stats[c]:>10.2f}" for c in columns))
+
+
+if __name__ == "__main__":
+    main()
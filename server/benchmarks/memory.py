@@ -0,0 +1,93 @@
+"""
+Memory of every server worker once the models are loaded, whether each worker loads its own (`uvicorn --workers`,
+"spawn") or they share those loaded once by the parent before forking them (`python -m server.serve`, "fork").
+
+    uv run python -m benchmarks.memory --workers 4
+
+Runs the actual server, hence needs its environment (database, store). USS is the memory used by a process alone,
+PSS splits shared pages evenly between the processes sharing them, so that PSS adds up to the memory of the node.
+"""
+
+import argparse
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+FIELDS = ("Rss", "Pss", "Private_Clean", "Private_Dirty")
+
+
+def children(pid: int) -> list[int]:
+    found = []
+    for stat in Path("/proc").glob("[0-9]*/stat"):
+        try:
+            # the command name may contain spaces, the parent id comes right after it
+            if int(stat.read_text().rsplit(")", 1)[1].split()[1]) == pid:
+                found.append(int(stat.parent.name))
+        except (OSError, ValueError, IndexError):
+            continue  # exited in the meantime
+    return sorted(found)
+
+
+def memory(pid: int) -> dict[str, float]:
+    """RSS, PSS and USS of the process in MiB."""
+    values = dict.fromkeys(FIELDS, 0)
+    for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines()[1:]:
+        name, value, *_ = line.split()
+        if (name := name.rstrip(":")) in values:
+            values[name] = int(value) / 1024  # kB
+    return {"rss": values["Rss"], "pss": values["Pss"], "uss": values["Private_Clean"] + values["Private_Dirty"]}
+
+
+def wait_ready(url: str, workers: int, timeout: float):
+    """Until every worker is likely ready: requests land on any of them, hence several in a row must succeed."""
+    deadline, streak = time.monotonic() + timeout, 0
+    while streak < 2 * workers:
+        if time.monotonic() > deadline:
+            raise TimeoutError("the server did not get ready in time")
+        try:
+            streak = streak + 1 if httpx.get(f"{url}/health").status_code == 200 else 0
+        except httpx.TransportError:
+            streak = 0
+        time.sleep(0.5)
+
+
+def measure(mode: str, command: list[str], args: argparse.Namespace):
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(f"http://127.0.0.1:{args.port}", args.workers, args.timeout)
+        time.sleep(args.settle)
+        total = memory(process.pid)
+        print(f"{mode:>6} {'parent':>8} {total['rss']:>8.0f} {total['pss']:>8.0f} {total['uss']:>8.0f}")
+        workers = [memory(pid) for pid in children(process.pid)]
+        for worker in workers:
+            print(f"{mode:>6} {'worker':>8} {worker['rss']:>8.0f} {worker['pss']:>8.0f} {worker['uss']:>8.0f}")
+            total = {key: total[key] + worker[key] for key in total}
+        print(f"{mode:>6} {'total':>8} {total['rss']:>8.0f} {total['pss']:>8.0f} {total['uss']:>8.0f}")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument("--timeout", type=float, default=600.0, help="seconds for the models to load")
+    parser.add_argument("--settle", type=float, default=5.0, help="seconds to wait once ready, before measuring")
+    parser.add_argument("--modes", nargs="+", default=["spawn", "fork"], choices=["spawn", "fork"])
+    args = parser.parse_args()
+
+    commands = {
+        "spawn": [sys.executable, "-m", "uvicorn", "server.main:app", "--workers", str(args.workers)],
+        "fork": [sys.executable, "-m", "server.serve", "--workers", str(args.workers)],
+    }
+    print(f"{'mode':>6} {'process':>8} {'RSS MiB':>8} {'PSS MiB':>8} {'USS MiB':>8}")
+    for mode in args.modes:
+        measure(mode, [*commands[mode], "--host", "127.0.0.1", "--port", str(args.port)], args)
+
+
+if __name__ == "__main__":
+    main()
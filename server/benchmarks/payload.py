@@ -0,0 +1,122 @@
+"""
+Size and serialization latency of the result payload, compact arrays against the previous representation
+(the full transcript with its audio, one `Alignment` per phoneme and the same alignments copied into `words`).
+
+    uv run python -m benchmarks.payload --words 16 --repeat 2000
+"""
+
+import argparse
+import base64
+import random
+import time
+from functools import cached_property
+
+from pydantic import TypeAdapter, computed_field
+from pydantic.dataclasses import dataclass
+
+from server.core.generators.feedback import Feedback
+from server.core.generators.transcript import Transcript
+from server.core.pipeline import Pronunciation, Result
+
+PHONEMES = "p b t d k ɡ f v s z ʃ h m n ŋ l ɹ w j i ɪ ɛ æ ə ʌ ɑ ɔ ʊ u aɪ oʊ eɪ".split()
+
+
+@dataclass(frozen=True, kw_only=True)
+class Alignment:
+    token: str
+    score: float
+    interval: tuple[int, int]
+
+
+@dataclass(frozen=True, kw_only=True)
+class LegacyPronunciation:
+    transcript: Transcript
+    phonemes: list[str]
+    alignments: list[Alignment]
+
+    @computed_field
+    @cached_property
+    def words(self) -> list[tuple[str, list[Alignment]]]:
+        return [(word, self.alignments[start:end]) for word, start, end in self.transcript.get_word_boundaries()]
+
+
+@dataclass(kw_only=True)
+class LegacyResult:
+    feedback: Feedback
+    pronunciation: LegacyPronunciation
+
+
+def sample(words: int, inline: bool) -> tuple[LegacyResult, Result]:
+    texts, sequences = [], []
+    for _ in range(words):
+        phones = random.choices(PHONEMES, k=random.randint(2, 6))
+        texts.append("".join(p[0] for p in phones))
+        sequences.append("/".join(phones))
+    audio = (
+        f"data:audio/mpeg;base64,{base64.b64encode(random.randbytes(words * 2500)).decode('ascii')}"
+        if inline
+        else f"/audio/{random.randbytes(16).hex()}.mp3"
+    )
+    transcript = Transcript(text=" ".join(texts), sequence=" ".join(sequences), audio=audio)
+    scores = [random.random() for _ in transcript.phonemes]
+    intervals = [(2 * i, 2 * i + 1) for i in range(len(scores))]
+    feedback = Feedback(text="Watch the vowel in the second word.", audio="")
+
+    legacy = LegacyResult(
+        feedback=feedback,
+        pronunciation=LegacyPronunciation(
+            transcript=transcript,
+            phonemes=transcript.phonemes,
+            alignments=[
+                Alignment(token=token, score=score, interval=interval)
+                for token, score, interval in zip(transcript.phonemes, scores, intervals)
+            ],
+        ),
+    )
+    compact = Result(
+        feedback=feedback,
+        pronunciation=Pronunciation(
+            phonemes=transcript.phonemes,
+            tokens=transcript.phonemes,
+            scores=scores,
+            intervals=intervals,
+            words=transcript.get_word_boundaries(),
+        ),
+    )
+    return legacy, compact
+
+
+def timeit(f, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        f()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--words", type=int, default=16)
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    LegacyModel, ResultModel = TypeAdapter(LegacyResult), TypeAdapter(Result)
+
+    print(f"{'payload':>14} {'bytes':>8} {'encode µs':>10} {'decode µs':>10}")
+    for inline in (False, True):
+        legacy, compact = sample(args.words, inline)
+        data = LegacyModel.dump_json(legacy)
+        # the response model used to be validated again before being encoded
+        encode = timeit(lambda legacy=legacy: LegacyModel.dump_json(LegacyModel.validate_python(legacy)), args.repeat)
+        decode = timeit(lambda data=data: LegacyModel.validate_json(data), args.repeat)
+        label = "legacy+inline" if inline else "legacy"
+        print(f"{label:>14} {len(data):>8} {encode:>10.1f} {decode:>10.1f}")
+    data = ResultModel.dump_json(compact)
+    encode = timeit(lambda: ResultModel.dump_json(compact), args.repeat)
+    decode = timeit(lambda: ResultModel.validate_json(data), args.repeat)
+    print(f"{'compact':>14} {len(data):>8} {encode:>10.1f} {decode:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Google TTS latency against a local stand-in of the `batchexecute` endpoint,
+comparing a client per request (sequential parts) with the pooled client (concurrent parts).
+
+    uv run python -m benchmarks.tts --requests 50 --latency-ms 80
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+from gtts import agTTS
+
+from server.core.textspeech import GoogleTextSpeech
+
+TEXT = (
+    "How much longer do you think the potatoes will take to bake in the oven, "
+    "because our guests are arriving in less than twenty minutes and nothing is ready yet?"
+)
+
+
+def batchexecute_response(text: str) -> bytes:
+    """Mimics the `batchexecute` response format: the audio is a base64 string nested in escaped JSON."""
+    audio = base64.b64encode(f"ID3-fake-mp3:{text}".encode("utf-8")).decode("ascii")
+    envelope = [["wrb.fr", "jQ1olc", json.dumps([audio]), None, None, None, "generic"]]
+    envelope = json.dumps(envelope, separators=(",", ":"))  # no spaces, as Google does
+    body = ")]}'\n\n" + f"{len(envelope)}\n" + envelope + "\n"
+    return body.encode("utf-8")
+
+
+def serve(latency: float) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            form = urllib.parse.parse_qs(self.rfile.read(length).decode("utf-8"))
+            [[[_, parameter, _, _]]] = json.loads(form["f.req"][0])
+            [text, *_] = json.loads(parameter)
+            time.sleep(latency)
+            body = batchexecute_response(text)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *_):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def unpooled(host: str, requests: int):
+    for _ in range(requests):
+        # what agTTS used to do: a fresh client, and a handshake, for every part
+        tts = agTTS(TEXT, lang="en", tld="us", lang_check=False, host=host)
+        for pr in tts._prepare_requests():
+            async with httpx.AsyncClient() as client:
+                (await client.send(pr)).raise_for_status()
+
+
+async def pooled(host: str, requests: int):
+    tts = GoogleTextSpeech(host=host)
+    try:
+        for _ in range(requests):
+            await tts(TEXT)
+    finally:
+        await tts.aclose()
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=80)
+    args = parser.parse_args()
+
+    server = serve(args.latency_ms / 1000)
+    host = f"http://127.0.0.1:{server.server_address[1]}"
+    parts = len(agTTS(TEXT, lang="en", tld="us", lang_check=False)._prepare_requests())
+    print(f"{parts} parts per request, {args.latency_ms:.0f}ms server latency")
+    for name, run in [("unpooled", unpooled), ("pooled", pooled)]:
+        start = time.perf_counter()
+        await run(host, args.requests)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>8}: {elapsed / args.requests * 1000:7.1f}ms per request")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,116 @@
+import asyncio
+import math
+import time
+from collections import Counter
+
+from ulid import ULID
+
+from .metrics import stage_seconds
+from .settings import settings
+
+SMOOTHING = 0.2  # weight of the latest analysis in the average duration, for `Retry-After` estimates
+
+
+class AdmissionError(Exception):
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QueueFullError(AdmissionError):
+    pass
+
+
+class UserLimitError(AdmissionError):
+    pass
+
+
+class Admission:
+    """
+    A place in the analysis queue, held from the upload until the analysis is over.
+    Entering it waits for a running slot and returns the seconds spent queued.
+    """
+
+    def __init__(self, queue: "AnalysisQueue", uid: ULID):
+        self._queue = queue
+        self._uid = uid
+        self._admitted_at = time.monotonic()
+        self._started_at: float | None = None
+        self._released = False
+
+    async def __aenter__(self) -> float:
+        await self._queue._slots.acquire()
+        self._started_at = time.monotonic()
+        waited = self._started_at - self._admitted_at
+        stage_seconds.observe(waited, "queue")
+        return waited
+
+    async def __aexit__(self, *_):
+        self._queue._slots.release()
+        self._queue._observe(time.monotonic() - self._started_at)
+        self.release()
+
+    def release(self):
+        """Gives the place back, e.g. when the upload fails before the analysis is scheduled."""
+        if not self._released:
+            self._released = True
+            self._queue._release(self._uid)
+
+
+class AnalysisQueue:
+    """
+    Bounds the analyses of a worker: at most `max_running` run at once, at most `max_queued` more wait for them,
+    and every user has at most `max_per_user` of them in flight. Anything beyond is rejected right away,
+    before the upload is even read, rather than piling up behind the models.
+    """
+
+    def __init__(
+        self,
+        max_running: int = settings.max_analyses,
+        max_queued: int = settings.max_queued_analyses,
+        max_per_user: int = settings.max_analyses_per_user,
+    ):
+        self.max_running = max_running
+        self.max_queued = max_queued
+        self.max_per_user = max_per_user
+        self._slots = asyncio.Semaphore(max_running)
+        self._pending = 0  # queued and running, only touched from the event loop
+        self._users: Counter[ULID] = Counter()
+        self._seconds = 0.0  # smoothed duration of an analysis
+
+    @property
+    def saturated(self) -> bool:
+        return self._pending >= self.max_running + self.max_queued
+
+    def retry_after(self, pending: int | None = None) -> int:
+        """Seconds until `pending` analyses are likely over (by default all of those in flight)."""
+        pending = self._pending if pending is None else pending
+        return max(1, math.ceil(self._seconds * pending / self.max_running))
+
+    def admit(self, uid: ULID) -> Admission:
+        if self._users[uid] >= self.max_per_user:
+            raise UserLimitError("Too many analyses in progress.", self.retry_after(self.max_running))
+        if self.saturated:
+            raise QueueFullError("Analysis queue is full.", self.retry_after())
+        self._pending += 1
+        self._users[uid] += 1
+        return Admission(self, uid)
+
+    def _release(self, uid: ULID):
+        self._pending -= 1
+        self._users[uid] -= 1
+        if not self._users[uid]:
+            del self._users[uid]
+
+    def _observe(self, seconds: float):
+        self._seconds = seconds if not self._seconds else SMOOTHING * seconds + (1 - SMOOTHING) * self._seconds
+
+    def stats(self) -> dict[str, int | float]:
+        return {
+            "pending": self._pending,
+            "users": len(self._users),
+            "max_running": self.max_running,
+            "max_queued": self.max_queued,
+            "max_per_user": self.max_per_user,
+            "analysis_seconds": self._seconds,
+        }
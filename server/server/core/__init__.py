@@ -1,6 +1,11 @@
+from typing import BinaryIO
+
+from .generators import close_gateways, get_gateway
 from .generators.feedback import Feedback
 from .generators.transcript import Transcript, TranscriptGenerator, Transcripts
-from .pipeline import Pipeline, Result
+from .pipeline import AudioTooLongError, ExecutorSaturatedError, Pipeline, Pronunciation, Result
+from .registry import registry
+from .textspeech import gtts
 
 
 class Yaplingo:
@@ -8,11 +13,45 @@ class Yaplingo:
         self._pipeline = Pipeline()
         self._transcript_generator = TranscriptGenerator()
 
-    async def analyze_audio(self, audio: bytes, transcript: Transcript) -> Result | None:
+    async def analyze_audio(self, audio: bytes | BinaryIO, transcript: Transcript) -> Result | None:
         return await self._pipeline(audio, transcript)
 
-    async def generate_transcripts(self) -> Transcripts:
-        return await self._transcript_generator()
+    async def assess_pronunciation(self, audio: bytes | BinaryIO, transcript: Transcript) -> Pronunciation | None:
+        return await self._pipeline.assess_pronunciation(audio, transcript)
+
+    async def generate_feedback(self, transcript: Transcript, pronunciation: Pronunciation) -> Feedback:
+        return await self._pipeline.generate_feedback(transcript, pronunciation)
+
+    def load_models(self):
+        registry.load_in_background()
+
+    @property
+    def topics(self) -> list[str]:
+        return TranscriptGenerator.TOPICS
+
+    async def generate_transcripts(self, topic: str | None = None) -> Transcripts:
+        return await self._transcript_generator(topic)
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        return {
+            "executor": self._pipeline.executor.stats(),
+            "audio": self._pipeline.audio_processor.stats(),
+            "llm": get_gateway().stats(),
+        }
+
+    async def dispose(self):
+        self._pipeline.dispose()
+        await gtts.aclose()
+        await close_gateways()
 
 
-__all__ = ["Yaplingo", "Result", "Transcript", "Transcripts", "Feedback"]
+__all__ = [
+    "Yaplingo",
+    "AudioTooLongError",
+    "ExecutorSaturatedError",
+    "Result",
+    "Pronunciation",
+    "Transcript",
+    "Transcripts",
+    "Feedback",
+]
@@ -1,13 +1,33 @@
+import asyncio
+import logging
+import time
 from abc import ABC, abstractmethod
+from typing import AsyncIterator, Callable, TypeVar
 
+import httpx
 from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletionMessageParam
+from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+from ...metrics import stage_seconds
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
 
 class Settings(BaseSettings):
     model_id: str = "ai/llama3.1"
     base_url: str = "http://model-runner.docker.internal/engines/v1"
     api_key: str = ""
+    feedback_cache_size: int = 4096  # feedback texts kept in memory per worker
+
+    max_concurrency: int = Field(default=4, ge=1)  # requests in flight per model, others wait in line
+    queue_timeout: float = Field(default=30.0, gt=0)  # seconds a request may wait for its turn
+    timeout: float = Field(default=60.0, gt=0)  # seconds per completion, once sent
+    max_retries: int = Field(default=2, ge=0)  # on connection errors, timeouts and 429/5xx responses
+    max_attempts: int = Field(default=3, ge=1)  # completions per call when the output is invalid
 
     model_config = SettingsConfigDict(env_prefix="llm_")
 
@@ -15,22 +35,163 @@ class Settings(BaseSettings):
 settings = Settings.model_validate({})
 
 
-class Generator(ABC):
+class GatewaySaturatedError(Exception):
     def __init__(self):
-        self._client = AsyncOpenAI(base_url=settings.base_url, api_key=settings.api_key)
+        super().__init__("Timed out waiting for the language model.")
+
+
+class InvalidOutputError(ValueError):
+    """Raised by output parsers to have the completion generated again."""
+
+
+class GenerationError(Exception):
+    def __init__(self, attempts: int):
+        super().__init__(f"No valid output after {attempts} attempts.")
+
+
+class LLMGateway:
+    """
+    Sends chat completions to one model, at most `max_concurrency` at a time, since a local model runner
+    only gets slower with more concurrent requests. Transient failures are retried by the client itself.
+    """
+
+    def __init__(
+        self,
+        model_id: str = settings.model_id,
+        max_concurrency: int = settings.max_concurrency,
+        queue_timeout: float = settings.queue_timeout,
+        http_client: httpx.AsyncClient | None = None,  # e.g. to an in-process server
+    ):
+        self.model_id = model_id
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self._client = AsyncOpenAI(
+            base_url=settings.base_url,
+            api_key=settings.api_key,
+            timeout=settings.timeout,
+            max_retries=settings.max_retries,
+            http_client=http_client,
+        )
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # metrics
+        self.requests = 0
+        self.failures = 0
+        self.waiting = 0
+        self.running = 0
+        self.queue_seconds = 0.0
+        self.latency_seconds = 0.0  # until the first token when streaming
+
+    def stats(self) -> dict[str, float]:
+        requests = max(self.requests, 1)
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "waiting": self.waiting,
+            "running": self.running,
+            "avg_queue_ms": self.queue_seconds / requests * 1000,
+            "avg_latency_ms": self.latency_seconds / requests * 1000,
+        }
+
+    async def _acquire(self):
+        start = time.perf_counter()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise GatewaySaturatedError()
+        finally:
+            self.waiting -= 1
+            self.queue_seconds += time.perf_counter() - start
+        self.requests += 1
+        self.running += 1
+
+    def _release(self):
+        self.running -= 1
+        self._semaphore.release()
+
+    async def complete(self, messages: list[ChatCompletionMessageParam], **kwargs) -> str:
+        await self._acquire()
+        start = time.perf_counter()
+        try:
+            completion = await self._client.chat.completions.create(model=self.model_id, messages=messages, **kwargs)
+        except Exception:
+            self.failures += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.latency_seconds += elapsed
+            stage_seconds.observe(elapsed, "llm")
+            self._release()
+        return completion.choices[0].message.content or ""
+
+    async def stream(self, messages: list[ChatCompletionMessageParam], **kwargs) -> AsyncIterator[str]:
+        """Yields the completion as it is generated, holding a slot until it is done."""
+        await self._acquire()
+        start = time.perf_counter()
+        first = True
+        try:
+            chunks = await self._client.chat.completions.create(
+                model=self.model_id, messages=messages, stream=True, **kwargs
+            )
+            async for chunk in chunks:
+                if first:
+                    self.latency_seconds += time.perf_counter() - start
+                    first = False
+                if chunk.choices and (content := chunk.choices[0].delta.content):
+                    yield content
+        except Exception:
+            self.failures += 1
+            raise
+        finally:
+            if first:
+                self.latency_seconds += time.perf_counter() - start
+            stage_seconds.observe(time.perf_counter() - start, "llm")
+            self._release()
+
+    async def aclose(self):
+        await self._client.close()
+
+
+_gateways: dict[str, LLMGateway] = {}
+
+
+def get_gateway(model_id: str = settings.model_id) -> LLMGateway:
+    """The gateway shared by every generator of the model, created on first use."""
+    if (gateway := _gateways.get(model_id)) is None:
+        gateway = _gateways[model_id] = LLMGateway(model_id)
+    return gateway
+
+
+async def close_gateways():
+    for gateway in _gateways.values():
+        await gateway.aclose()
+    _gateways.clear()
+
+
+class Generator(ABC):
+    def __init__(self, gateway: LLMGateway | None = None):
+        self._gateway = gateway or get_gateway()
 
     @property
     @abstractmethod
     def system_prompt(self) -> str:
         raise NotImplementedError
 
-    async def __call__(self, prompt: str, **kwargs) -> str:
-        completion = await self._client.chat.completions.create(
-            model=settings.model_id,
-            messages=[
-                {"role": "system", "content": self.system_prompt},
-                {"role": "user", "content": prompt},
-            ],
-            **kwargs,
-        )
-        return completion.choices[0].message.content or ""
+    def _messages(self, prompt: str) -> list[ChatCompletionMessageParam]:
+        return [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": prompt},
+        ]
+
+    async def __call__(self, prompt: str, parse: Callable[[str], T] = str, **kwargs) -> T:
+        """Returns the parsed completion, generated again whenever `parse` raises `InvalidOutputError`."""
+        for attempt in range(1, settings.max_attempts + 1):
+            text = await self._gateway.complete(self._messages(prompt), **kwargs)
+            try:
+                return parse(text)
+            except InvalidOutputError as e:
+                logger.warning("invalid output from %s (attempt %d): %s", self._gateway.model_id, attempt, e)
+        raise GenerationError(settings.max_attempts)
+
+    def stream(self, prompt: str, **kwargs) -> AsyncIterator[str]:
+        return self._gateway.stream(self._messages(prompt), **kwargs)
@@ -1,13 +1,22 @@
+import asyncio
+import hashlib
+import json
+import logging
+from functools import cached_property
 from pathlib import Path
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Protocol
 
 from pydantic.dataclasses import dataclass
 
+from ...logs import sampled
+from ...utils import LRUCache
 from ..generators.transcript import Transcript
-from . import Generator
+from . import Generator, settings
 
 if TYPE_CHECKING:
-    from ..pipeline.aligner import Pronunciation
+    from ..pipeline.aligner import Difference, Pronunciation
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass(frozen=True, kw_only=True)
@@ -21,22 +30,94 @@ class Feedback:
         return cls(text=text, audio="")
 
 
+class FeedbackBackend(Protocol):
+    async def get_feedback(self, key: str) -> str | None: ...
+
+    async def save_feedback(self, key: str, text: str): ...
+
+
+class FeedbackCache:
+    """
+    Feedback texts by the signature of the mistakes they are about: an in-memory LRU tier,
+    backed by an optional shared tier (the store) once attached.
+    """
+
+    def __init__(self, maxsize: int = settings.feedback_cache_size):
+        self._memory: LRUCache[str, str] = LRUCache(maxsize)
+        self._backend: FeedbackBackend | None = None
+
+    def attach(self, backend: FeedbackBackend):
+        self._backend = backend
+
+    @staticmethod
+    def key(version: str, text: str, differences: list["Difference"]) -> str:
+        signature = sorted((d.word, d.operation, d.expected or "", d.predicted or "") for d in differences)
+        data = json.dumps([version, text, signature], ensure_ascii=False, separators=(",", ":"))
+        return hashlib.blake2b(data.encode("utf-8"), digest_size=16).hexdigest()
+
+    async def get(self, key: str) -> str | None:
+        if (text := self._memory.get(key)) is not None:
+            return text
+        if self._backend is not None and (text := await self._backend.get_feedback(key)) is not None:
+            self._memory.put(key, text)
+        return text
+
+    async def put(self, key: str, text: str):
+        self._memory.put(key, text)
+        if self._backend is not None:
+            await self._backend.save_feedback(key, text)
+
+
+feedback_cache = FeedbackCache()
+
+
 class FeedbackGenerator(Generator):
-    @property  # FIXME: use `@cached_property` in production
+    def __init__(self):
+        super().__init__()
+        self._inflight: dict[str, asyncio.Task[str]] = {}  # concurrent identical requests share one completion
+
+    @cached_property
     def system_prompt(self) -> str:
         path = Path(__file__).parent / "prompts" / "feedback.md"
         return path.read_text(encoding="utf-8").strip()
 
+    @cached_property
+    def version(self) -> str:
+        """Changes along with the prompt or the model, so that feedback cached before is not reused."""
+        data = f"{settings.model_id}\0{self.system_prompt}".encode("utf-8")
+        return hashlib.blake2b(data, digest_size=8).hexdigest()
+
     async def __call__(self, transcript: Transcript, pronunciation: "Pronunciation") -> Feedback:
         differences = pronunciation.get_differences()
+        key = FeedbackCache.key(self.version, transcript.text, differences)
+        if (text := await feedback_cache.get(key)) is None:
+            if (task := self._inflight.get(key)) is None:
+                task = asyncio.create_task(self._generate(key, transcript, pronunciation, differences))
+                self._inflight[key] = task
+                task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            text = await asyncio.shield(task)  # a cancelled caller must not cancel the others
+        return await Feedback.from_text(text)
+
+    async def _generate(
+        self,
+        key: str,
+        transcript: Transcript,
+        pronunciation: "Pronunciation",
+        differences: list["Difference"],
+    ) -> str:
         errors = "\n".join([f"\t- {d}" for d in differences]) if differences else "None"
         prompt = f"""
         Text: "{transcript.text}"
         Errors: \n{errors}
         """
-        print(prompt)  # DEBUG
-        print("/".join(transcript.phonemes))  # DEBUG
-        print("/".join(pronunciation.phonemes))  # DEBUG
         text = await super().__call__(prompt, temperature=0)
-        print(text)  # DEBUG
-        return await Feedback.from_text(text.strip())
+        if sampled():
+            logger.debug(
+                "feedback on %s -> %s: %s -> %s",
+                "/".join(pronunciation.tokens),
+                "/".join(pronunciation.phonemes),
+                prompt.strip(),
+                text.strip(),
+            )
+        await feedback_cache.put(key, text := text.strip())
+        return text
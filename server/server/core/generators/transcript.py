@@ -1,6 +1,8 @@
 import asyncio
+import logging
 import random
 import re
+import threading
 from functools import cached_property
 from pathlib import Path
 
@@ -11,12 +13,39 @@ from pydantic import Field
 from pydantic.dataclasses import dataclass
 from ulid import ULID
 
+from ...logs import sampled
+from ...metrics import stage_seconds
 from ...utils import cached_method
 from ..textspeech import gtts
-from . import Generator
+from . import Generator, InvalidOutputError
+
+logger = logging.getLogger(__name__)
 
 SEPARATOR = Separator(phone="/", word=" ")
 PUNCTUATION = Punctuation()
+LINE_CACHE_SIZE = 10_000  # clauses between punctuation, the model often generates the same ones again
+
+_phonemizer_lock = threading.Lock()  # espeak-ng is not thread-safe
+
+
+def phonemize_texts(texts: list[str]) -> list[str]:
+    """
+    Phonemizes all texts in a single backend call. Sentences are phonemized as a whole, keeping the weak forms
+    and other cross-word effects learners are scored against, and cached as a whole across calls.
+    """
+    with _phonemizer_lock, stage_seconds.time("phonemize"):
+        sequences = phonemize(
+            texts,
+            strip=True,
+            with_stress=False,
+            preserve_punctuation=True,
+            preserve_empty_lines=True,
+            separator=SEPARATOR,
+            language="en-us",
+            backend="espeak",
+            line_cache_size=LINE_CACHE_SIZE,
+        )
+    return [str(sequence) for sequence in sequences]
 
 
 @dataclass(frozen=True, kw_only=True)
@@ -28,17 +57,19 @@ class Transcript:
 
     @classmethod
     async def from_text(cls, text: str) -> "Transcript":
-        sequence = phonemize(
-            text,
-            strip=True,
-            with_stress=False,
-            preserve_punctuation=True,
-            separator=SEPARATOR,
-            language="en-us",
-            backend="espeak",
+        [transcript] = await cls.from_texts([text])
+        return transcript
+
+    @classmethod
+    async def from_texts(cls, texts: list[str]) -> list["Transcript"]:
+        # phonemization is blocking ctypes work, keep it off the event loop while speech is synthesized
+        sequences, audios = await asyncio.gather(
+            asyncio.to_thread(phonemize_texts, texts),
+            asyncio.gather(*[gtts(text) for text in texts]),
         )
-        audio = await gtts(text)
-        return cls(text=text, sequence=str(sequence), audio=audio)
+        return [
+            cls(text=text, sequence=sequence, audio=audio) for text, sequence, audio in zip(texts, sequences, audios)
+        ]
 
     @cached_property
     def phonemes(self) -> list[str]:
@@ -73,19 +104,26 @@ class TranscriptGenerator(Generator):
         path = Path(__file__).parent / "prompts" / "transcript.md"
         return path.read_text(encoding="utf-8").strip()
 
-    async def __call__(self) -> Transcripts:
-        topic = random.choice(self.TOPICS)
-        text = await super().__call__(
+    @staticmethod
+    def parse(text: str) -> tuple[str, list[str]]:
+        """Splits the output into the scenario and its sentences."""
+        lines = list(filter(bool, [s.strip() for s in text.splitlines()]))
+        if len(lines) < 6:
+            raise InvalidOutputError(f"expected a scenario and 5 sentences, got {len(lines)} lines")
+        scenario = re.split(r"^\s?[+]\s?", lines[0], maxsplit=1)[-1].strip()
+        sentences = [re.split(r"^\s?[-–*]\s?", line, maxsplit=1)[-1].strip() for line in lines[1:]]
+        return scenario, sentences
+
+    async def __call__(self, topic: str | None = None) -> Transcripts:
+        topic = topic or random.choice(self.TOPICS)
+        scenario, sentences = await super().__call__(
             f"Topic: {topic}",
+            parse=TranscriptGenerator.parse,
             temperature=1.25,
             # frequency_penalty=2.0,
             # presence_penalty=2.0,
         )
-        print(f"{'=' * 10} TRANSCRIPTS {'=' * 10}\n@ {topic}\n{text}\n{'=' * 30}")  # DEBUG
-        lines = list(filter(bool, [s.strip() for s in text.splitlines()]))
-        if len(lines) < 6:
-            return await self()  # FIXME: retry on invalid output
-        scenario = re.split(r"^\s?[+]\s?", lines[0], maxsplit=1)[-1].strip()
-        sentences = [re.split(r"^\s?[-–*]\s?", line, maxsplit=1)[-1].strip() for line in lines[1:]]
-        items = await asyncio.gather(*[Transcript.from_text(s) for s in sentences])
+        if sampled():
+            logger.debug("transcripts on %s: %s %s", topic, scenario, sentences)
+        items = await Transcript.from_texts(sentences)
         return Transcripts(topic=topic, scenario=scenario, items=items)
@@ -1,10 +1,77 @@
 from typing import Literal
 
+import numpy as np
+
 OperationCode = Literal["~", "-", "+"]
 Operation = tuple[OperationCode, int, int]
 
+INFINITY = np.iinfo(np.int32).max // 2  # outside of the band, still safe to add to
+
+
+def _encode(s1: list[str], s2: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """Maps both sequences of strings onto the same integer ids."""
+    vocabulary: dict[str, int] = {}
+    a = np.fromiter((vocabulary.setdefault(s, len(vocabulary)) for s in s1), dtype=np.int32, count=len(s1))
+    b = np.fromiter((vocabulary.setdefault(s, len(vocabulary)) for s in s2), dtype=np.int32, count=len(s2))
+    return a, b
+
 
-def levenshtein(s1: list[str], s2: list[str]) -> tuple[list[str], list[str], list[Operation]]:
+class _Distances:
+    """
+    The DP matrix, filled one row at a time, each row being vectorized: substitutions and deletions only depend
+    on the previous row, and the chain of insertions within a row is resolved with a running minimum, since
+    `dp[i][j] = min(row[k] + j - k for k <= j)`. With a band, only the columns within `band` of the diagonal
+    going from (0, 0) to (m, n) are computed and stored, by their offset from the first column of their row,
+    which bounds both time and memory by `m * band`. Cells are stored in the narrowest dtype that fits.
+    """
+
+    def __init__(self, a: np.ndarray, b: np.ndarray, band: int | None):
+        m, n = len(a), len(b)
+        dtype = np.uint16 if m + n < np.iinfo(np.uint16).max else np.int32
+        width = n + 1 if band is None else min(n + 1, 2 * band + 1)
+
+        # first and last column stored in every row, as plain ints since they are read one at a time
+        if band is None:
+            self.lo, self.hi = [0] * (m + 1), [n] * (m + 1)
+        else:
+            diagonal = np.arange(m + 1) * n / max(m, 1)
+            self.lo = np.maximum(0, np.ceil(diagonal - band)).astype(np.int64).tolist()
+            self.hi = np.minimum(n, np.floor(diagonal + band)).astype(np.int64).tolist()
+        self.cells = np.empty((m + 1, width), dtype=dtype)
+        self._item = self.cells.item
+
+        limit = np.iinfo(dtype).max
+        columns = np.arange(n + 1, dtype=np.int64)
+        previous = columns[: self.hi[0] + 1]  # the first row starts at column 0
+        self.cells[0, : len(previous)] = np.minimum(previous, limit)
+        for i in range(1, m + 1):
+            lo, hi = self.lo[i], self.hi[i]
+            offset, last = self.lo[i - 1], self.hi[i - 1]  # columns stored in the previous row
+            row = np.full(hi - lo + 1, INFINITY, dtype=np.int64)
+            if lo == 0:
+                row[0] = i
+            # deletions, from the cell above
+            start, stop = max(lo, 1), min(hi, last)
+            row[start - lo : stop - lo + 1] = previous[start - offset : stop - offset + 1] + 1
+            # substitutions, from the cell above on the left
+            start, stop = max(lo, 1, offset + 1), min(hi, last + 1)
+            substitutions = previous[start - 1 - offset : stop - offset] + (b[start - 1 : stop] != a[i - 1])
+            np.minimum(row[start - lo : stop - lo + 1], substitutions, out=row[start - lo : stop - lo + 1])
+            # insertions, from the cell on the left
+            row = np.minimum.accumulate(row - columns[lo : hi + 1]) + columns[lo : hi + 1]
+            self.cells[i, : len(row)] = np.minimum(row, limit)
+            previous = row
+
+    def __call__(self, i: int, j: int) -> int:
+        lo = self.lo[i]
+        return self._item(i, j - lo) if lo <= j <= self.hi[i] else INFINITY
+
+
+def levenshtein(
+    s1: list[str],
+    s2: list[str],
+    band: int | None = None,
+) -> tuple[list[str], list[str], list[Operation]]:
     """
     Computes the Levenshtein distance for two sequences of strings.
     Returns the aligned sequences with gaps filled with empty strings,
@@ -12,24 +79,21 @@ def levenshtein(s1: list[str], s2: list[str]) -> tuple[list[str], list[str], lis
     - operation is `~`, `-`, or `+`
     - `i` is the index in `s1`
     - `j` is the index in `s2`
+
+    When `band` is given, only cells within `band` of the diagonal are computed (widened to at least
+    the length difference), which bounds the work for long sequences at the cost of exactness
+    when the optimal alignment strays further away.
     """
 
     m, n = len(s1), len(s2)
+    if band is not None:
+        band = max(band, abs(m - n), 1)
+        if band >= max(m, n):
+            band = None  # covers the whole matrix anyway
 
-    dp = [[0] * (n + 1) for _ in range(m + 1)]
-    for i in range(m + 1):
-        dp[i][0] = i
-    for j in range(n + 1):
-        dp[0][j] = j
-
-    for i in range(1, m + 1):
-        for j in range(1, n + 1):
-            cost = 0 if s1[i - 1] == s2[j - 1] else 1
-            dp[i][j] = min(
-                dp[i - 1][j - 1] + cost,  # substitution
-                dp[i - 1][j] + 1,  # deletion
-                dp[i][j - 1] + 1,  # insertion
-            )
+    a, b = _encode(s1, s2)
+    cell = _Distances(a, b, band)  # the traceback only visits O(m + n) cells
+    a, b = a.tolist(), b.tolist()
 
     as1 = []
     as2 = []
@@ -37,8 +101,8 @@ def levenshtein(s1: list[str], s2: list[str]) -> tuple[list[str], list[str], lis
     i, j = m, n
     while i > 0 or j > 0:
         if i > 0 and j > 0:
-            cost = 0 if s1[i - 1] == s2[j - 1] else 1
-            if dp[i][j] == dp[i - 1][j - 1] + cost:
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            if cell(i, j) == cell(i - 1, j - 1) + cost:
                 as1.append(s1[i - 1])
                 as2.append(s2[j - 1])
                 if cost == 1:  # substitution/replace
@@ -46,13 +110,13 @@ def levenshtein(s1: list[str], s2: list[str]) -> tuple[list[str], list[str], lis
                 i -= 1
                 j -= 1
                 continue
-        if j > 0 and dp[i][j] == dp[i][j - 1] + 1:
+        if j > 0 and cell(i, j) == cell(i, j - 1) + 1:
             as1.append("")
             as2.append(s2[j - 1])
             operations.append(("+", i, j - 1))
             j -= 1
             continue
-        if i > 0 and dp[i][j] == dp[i - 1][j] + 1:
+        if i > 0 and cell(i, j) == cell(i - 1, j) + 1:
             as1.append(s1[i - 1])
             as2.append("")
             operations.append(("-", i - 1, j))
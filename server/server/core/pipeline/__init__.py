@@ -1,9 +1,13 @@
+from typing import BinaryIO
+
 from pydantic.dataclasses import dataclass
 
 from ..generators.feedback import Feedback, FeedbackGenerator
 from ..generators.transcript import Transcript
 from .aligner import Pronunciation, PronunciationAligner
-from .processor import AudioProcessor
+from .batcher import InferenceBatcher
+from .executor import ExecutorSaturatedError, InferenceExecutor
+from .processor import AudioProcessor, AudioTooLongError
 
 
 @dataclass(kw_only=True)
@@ -14,14 +18,41 @@ class Result:
 
 class Pipeline:
     def __init__(self, do_noise_filter: bool = True):
+        self.executor = InferenceExecutor()
         self.audio_processor = AudioProcessor(use_df=do_noise_filter)
         self.pronunciation_aligner = PronunciationAligner()
         self.feedback_generator = FeedbackGenerator()
+        self.batcher = InferenceBatcher(self.pronunciation_aligner, self.executor)
 
-    async def __call__(self, audio: bytes, transcript: Transcript) -> Result | None:
-        waveform = self.audio_processor(audio)
+    async def assess_pronunciation(self, audio: bytes | BinaryIO, transcript: Transcript) -> Pronunciation | None:
+        # CPU-heavy stages run on the inference executor to keep the event loop responsive
+        waveform = await self.executor(self.audio_processor, audio)
         if waveform is None:
             return None
-        pronunciation = self.pronunciation_aligner(waveform, transcript)
-        feedback = await self.feedback_generator(transcript, pronunciation)
+        logits = await self.batcher(waveform)  # concurrent analyses share wav2vec2 forward passes
+        return await self.executor(self.pronunciation_aligner.from_logits, logits, transcript)
+
+    async def generate_feedback(self, transcript: Transcript, pronunciation: Pronunciation) -> Feedback:
+        return await self.feedback_generator(transcript, pronunciation)
+
+    async def __call__(self, audio: bytes | BinaryIO, transcript: Transcript) -> Result | None:
+        if (pronunciation := await self.assess_pronunciation(audio, transcript)) is None:
+            return None
+        feedback = await self.generate_feedback(transcript, pronunciation)
         return Result(feedback=feedback, pronunciation=pronunciation)
+
+    def dispose(self):
+        self.executor.shutdown()
+
+
+__all__ = [
+    "Pipeline",
+    "AudioTooLongError",
+    "ExecutorSaturatedError",
+    "Result",
+    "Pronunciation",
+    "PronunciationAligner",
+    "AudioProcessor",
+    "InferenceBatcher",
+    "InferenceExecutor",
+]
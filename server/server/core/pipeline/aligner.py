@@ -1,24 +1,23 @@
-from functools import cached_property
+import logging
+from functools import partial
 
 import torch
 import torchaudio
-from pydantic import computed_field
 from pydantic.dataclasses import dataclass
 from transformers import Wav2Vec2ForCTC, Wav2Vec2PhonemeCTCTokenizer, Wav2Vec2Processor
 
+from ...metrics import stage_seconds
 from ...utils import cached_method
 from ..generators.transcript import Transcript
 from ..levenshtein import OperationCode, levenshtein
+from ..registry import registry
+from .backends import InferenceBackend, create_backend
 from .processor import AudioProcessor
+from .settings import settings
 
-CONFIDENCE_THRESHOLD = 0.75  # for filtering out differences with high enough confidence
-
+logger = logging.getLogger(__name__)
 
-@dataclass(frozen=True, kw_only=True)
-class Alignment:
-    token: str
-    score: float
-    interval: tuple[int, int]
+CONFIDENCE_THRESHOLD = 0.75  # for filtering out differences with high enough confidence
 
 
 @dataclass(frozen=True, kw_only=True)
@@ -42,34 +41,32 @@ class Difference:
 
 @dataclass(frozen=True, kw_only=True)
 class Pronunciation:
-    transcript: Transcript
-    phonemes: list[str]  # predictions
-    alignments: list[Alignment]
+    """
+    Parallel arrays over the transcript's phonemes (`tokens`, `scores`, `intervals` in frames),
+    with `words` given as `(word, start, end)` offsets into them.
+    """
 
-    @computed_field
-    @cached_property
-    def words(self) -> list[tuple[str, list[Alignment]]]:
-        alignments = []
-        boundaries = self.transcript.get_word_boundaries()
-        for word, start, end in boundaries:
-            alignments.append((word, self.alignments[start:end]))
-        return alignments
+    phonemes: list[str]  # predictions
+    tokens: list[str]  # expected
+    scores: list[float]
+    intervals: list[tuple[int, int]]
+    words: list[tuple[str, int, int]]
 
     @cached_method
     def get_differences(self) -> list[Difference]:
         differences = []
-        boundaries = self.transcript.get_word_boundaries()
-        _, _, operations = levenshtein(self.transcript.phonemes, self.phonemes)
+        with stage_seconds.time("levenshtein"):
+            _, _, operations = levenshtein(self.tokens, self.phonemes)
         for opcode, i, j in operations:
-            if self.alignments[i].score >= CONFIDENCE_THRESHOLD:
+            if self.scores[i] >= CONFIDENCE_THRESHOLD:
                 continue  # skip phonemes with high enough confidence (consider them as correct)
-            for word, start, end in boundaries:
+            for word, start, end in self.words:
                 if start <= i < end:
                     differences.append(
                         Difference(
                             word=word,
                             operation=opcode,
-                            expected=self.transcript.phonemes[i] if opcode != "+" else None,
+                            expected=self.tokens[i] if opcode != "+" else None,
                             predicted=self.phonemes[j] if opcode != "-" else None,
                         )
                     )
@@ -82,52 +79,174 @@ class Pronunciation:
 class PronunciationAligner:
     MODEL_ID = "facebook/wav2vec2-lv-60-espeak-cv-ft"
 
-    def __init__(self):
-        self._model = Wav2Vec2ForCTC.from_pretrained(PronunciationAligner.MODEL_ID)
-        self._processor = Wav2Vec2Processor.from_pretrained(PronunciationAligner.MODEL_ID)
-        self._tokenizer = Wav2Vec2PhonemeCTCTokenizer.from_pretrained(PronunciationAligner.MODEL_ID)
+    def __init__(
+        self,
+        backend: str | None = None,
+        chunk_seconds: float = settings.chunk_seconds,
+        chunk_overlap_seconds: float = settings.chunk_overlap_seconds,
+        chunk_batch: int = settings.max_batch,
+    ):
+        if chunk_overlap_seconds >= chunk_seconds:
+            raise ValueError("chunk_overlap_seconds must be less than chunk_seconds")
+        self.chunk_seconds = chunk_seconds
+        self.chunk_overlap_seconds = chunk_overlap_seconds
+        self.chunk_batch = chunk_batch
+        # the configured backend is shared by the whole process, others are registered on their own
+        self._model_name = "wav2vec2" if backend is None else f"wav2vec2:{backend}"
+        registry.register(
+            self._model_name,
+            partial(PronunciationAligner._load, backend),
+            warmup=PronunciationAligner._warmup,
+            # ONNX Runtime's thread pool is created along with the session and doesn't survive a fork
+            fork_safe=(backend or settings.aligner_backend) != "onnx",
+        )
+
+    @staticmethod
+    def _load(backend: str | None = None) -> tuple[Wav2Vec2Processor, InferenceBackend]:
+        # the processor already holds the phoneme tokenizer, no need to load it on its own
+        processor = Wav2Vec2Processor.from_pretrained(PronunciationAligner.MODEL_ID)
+        model = Wav2Vec2ForCTC.from_pretrained(PronunciationAligner.MODEL_ID)
+        return processor, create_backend(model, backend)
+
+    @staticmethod
+    def _warmup(loaded: tuple[Wav2Vec2Processor, InferenceBackend]):
+        processor, backend = loaded
+        inputs = processor(torch.randn(AudioProcessor.SR) * 0.01, sampling_rate=AudioProcessor.SR, return_tensors="pt")
+        backend(inputs.input_values)
+
+    @property
+    def _processor(self) -> Wav2Vec2Processor:
+        return registry.get(self._model_name)[0]
+
+    @property
+    def _backend(self) -> InferenceBackend:
+        return registry.get(self._model_name)[1]
+
+    @property
+    def _tokenizer(self) -> Wav2Vec2PhonemeCTCTokenizer:
+        return self._processor.tokenizer
+
+    def _samples(self, seconds: float) -> int:
+        # whole numbers of frames, so that windows start on frame boundaries
+        stride = self._backend.stride
+        return round(seconds * AudioProcessor.SR / stride) * stride
+
+    @property
+    def chunk_size(self) -> int:
+        return self._samples(self.chunk_seconds)
+
+    @property
+    def overlap_size(self) -> int:
+        return self._samples(self.chunk_overlap_seconds)
 
     def perform_inference(self, waveform: torch.Tensor) -> torch.Tensor:
+        if waveform.shape[-1] > self.chunk_size:
+            return self.perform_chunked_inference(waveform)
         inputs = self._processor(
             waveform,
             sampling_rate=AudioProcessor.SR,
             return_tensors="pt",  # required
         )
-        with torch.inference_mode():
-            return self._model(**inputs).logits
+        with stage_seconds.time("wav2vec2"):
+            return self._backend(inputs.input_values)
+
+    def perform_batch_inference(self, waveforms: list[torch.Tensor]) -> list[torch.Tensor]:
+        """
+        Runs a single forward pass over waveforms of different lengths, padded with an attention mask,
+        and splits the logits back into `(1, frames, vocab)` tensors trimmed to each waveform's own length.
+        Waveforms longer than a chunk are run on their own, in windows.
+        """
+        if len(waveforms) == 1:
+            return [self.perform_inference(waveforms[0])]
+        if any(waveform.shape[-1] > self.chunk_size for waveform in waveforms):
+            # long waveforms would pad the whole batch to their length, run them on their own instead
+            short = [waveform for waveform in waveforms if waveform.shape[-1] <= self.chunk_size]
+            batched = iter(self.perform_batch_inference(short) if short else [])
+            return [
+                self.perform_chunked_inference(waveform) if waveform.shape[-1] > self.chunk_size else next(batched)
+                for waveform in waveforms
+            ]
+        inputs = self._processor(
+            [waveform.numpy() for waveform in waveforms],
+            sampling_rate=AudioProcessor.SR,
+            padding=True,
+            return_attention_mask=True,
+            return_tensors="pt",  # required
+        )
+        lengths = torch.tensor([waveform.shape[-1] for waveform in waveforms])
+        frames = self._backend.frames(lengths).tolist()
+        with stage_seconds.time("wav2vec2"):
+            logits = self._backend(inputs.input_values, inputs.attention_mask)
+        return [logits[i : i + 1, :n] for i, n in enumerate(frames)]
+
+    def perform_chunked_inference(self, waveform: torch.Tensor) -> torch.Tensor:
+        """
+        Runs overlapping windows of the waveform through wav2vec2, a few at a time, so that memory is bounded
+        by the window size rather than the waveform length. Windows start on frame boundaries, so their logits
+        are stitched back exactly where the full pass would have put them: each window keeps its frames up to
+        the middle of the overlap with the next one, which keeps as much context as possible on both sides.
+        """
+        stride, size, overlap = self._backend.stride, self.chunk_size, self.overlap_size
+        length = waveform.shape[-1]
+        step = size - overlap
+        starts = list(range(0, max(length - overlap, 1), step))  # the last window is longer than the overlap
+        margin = overlap // 2 // stride  # frames dropped on each inner side of a window
+
+        chunks: list[torch.Tensor] = []
+        for i in range(0, len(starts), self.chunk_batch):
+            windows = [waveform[start : start + size] for start in starts[i : i + self.chunk_batch]]
+            chunks.extend(self.perform_batch_inference(windows))
+
+        stitched = []
+        for i, logits in enumerate(chunks):
+            first = 0 if i == 0 else margin
+            last = logits.shape[1] if i == len(starts) - 1 else step // stride + margin
+            stitched.append(logits[:, first:last])
+        logits = torch.cat(stitched, dim=1)
+        assert logits.shape[1] == self._backend.frames(torch.tensor(length)).item(), "stitched logits must match"
+        return logits
 
     def predict_phonemes(self, logits: torch.Tensor) -> list[str]:
         predictions = logits.argmax(dim=-1)
         [phonemes] = self._tokenizer.batch_decode(predictions)
         return phonemes.split()
 
-    def align_phonemes(self, logits: torch.Tensor, transcript: Transcript) -> list[Alignment]:
-        tokens = self._tokenizer(transcript.text).input_ids
+    def align_phonemes(self, logits: torch.Tensor, transcript: Transcript) -> tuple[list[float], list[tuple[int, int]]]:
+        """Returns the score and frame interval of every phoneme of the transcript."""
+        # align against the transcript's own phonemes rather than phonemizing the text again
+        tokens = self._tokenizer.convert_tokens_to_ids(transcript.phonemes)
+        # espeak phones missing from the wav2vec2 vocabulary would be aligned as `<unk>`, hence scored poorly
+        if unknown := [p for p, t in zip(transcript.phonemes, tokens) if t == self._tokenizer.unk_token_id]:
+            logger.warning("%d of %d phonemes are unknown to wav2vec2: %s", len(unknown), len(tokens), unknown)
         tokens = torch.tensor([tokens], dtype=torch.int32)
 
         log_probs = logits.log_softmax(dim=-1)
 
         [alignments], [scores] = torchaudio.functional.forced_align(log_probs, tokens)
-        spans = torchaudio.functional.merge_tokens(alignments, scores.exp())
 
-        return [
-            Alignment(
-                token=self._tokenizer.convert_ids_to_tokens(s.token),
-                score=s.score,
-                interval=(s.start, s.end),
-            )
-            for s in spans
-        ]
+        # same spans as `torchaudio.functional.merge_tokens`, without a `TokenSpan` object per phoneme
+        boundary = alignments.new_tensor([-1])
+        changes = torch.diff(alignments, prepend=boundary, append=boundary).nonzero().squeeze(1)
+        starts, ends = changes[:-1], changes[1:]
+        spoken = alignments[starts] != 0  # blank
+        starts, ends = starts[spoken], ends[spoken]
+        cumulative = torch.nn.functional.pad(scores.exp().double().cumsum(0), (1, 0))
+        means = (cumulative[ends] - cumulative[starts]) / (ends - starts)
 
-    def __call__(self, waveform: torch.Tensor, transcript: Transcript) -> Pronunciation:
-        logits = self.perform_inference(waveform)
+        return means.tolist(), list(zip(starts.tolist(), ends.tolist()))
+
+    def from_logits(self, logits: torch.Tensor, transcript: Transcript) -> Pronunciation:
         predicted_phonemes = self.predict_phonemes(logits)
-        aligned_phonemes = self.align_phonemes(logits, transcript)
-        assert len(aligned_phonemes) == len(transcript.phonemes), (
-            "alignment output must have the same length with the transcript"
-        )
+        with stage_seconds.time("align"):
+            scores, intervals = self.align_phonemes(logits, transcript)
+        assert len(scores) == len(transcript.phonemes), "alignment output must have the same length with the transcript"
         return Pronunciation(
-            transcript=transcript,
             phonemes=predicted_phonemes,
-            alignments=aligned_phonemes,
+            tokens=transcript.phonemes,
+            scores=scores,
+            intervals=intervals,
+            words=transcript.get_word_boundaries(),
         )
+
+    def __call__(self, waveform: torch.Tensor, transcript: Transcript) -> Pronunciation:
+        return self.from_logits(self.perform_inference(waveform), transcript)
@@ -0,0 +1,63 @@
+import asyncio
+
+import torch
+
+from .aligner import PronunciationAligner
+from .executor import InferenceExecutor
+from .settings import settings
+
+
+class InferenceBatcher:
+    """
+    Collects waveforms submitted concurrently for up to `max_wait_ms` or `max_batch` items,
+    and runs them through wav2vec2 in a single forward pass on the inference executor.
+    """
+
+    def __init__(
+        self,
+        aligner: PronunciationAligner,
+        executor: InferenceExecutor,
+        max_batch: int = settings.max_batch,
+        max_wait_ms: float = settings.max_wait_ms,
+    ):
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._aligner = aligner
+        self._executor = executor
+        self._pending: list[tuple[torch.Tensor, asyncio.Future[torch.Tensor]]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()  # keep strong references to running batches
+
+    async def __call__(self, waveform: torch.Tensor) -> torch.Tensor:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((waveform, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list[tuple[torch.Tensor, asyncio.Future[torch.Tensor]]]):
+        waveforms = [waveform for waveform, _ in batch]
+        try:
+            logits = await self._executor(self._aligner.perform_batch_inference, waveforms)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), item in zip(batch, logits):
+            if not future.done():  # the caller may have been cancelled meanwhile
+                future.set_result(item)
@@ -0,0 +1,88 @@
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, ParamSpec, TypeVar
+
+import torch
+
+from .settings import settings
+
+P = ParamSpec("P")
+T = TypeVar("T")
+
+
+class ExecutorSaturatedError(Exception):
+    def __init__(self):
+        super().__init__("Inference executor queue is full.")
+
+
+class InferenceExecutor:
+    """
+    Runs the CPU-heavy pipeline stages (decoding, denoising, wav2vec2) on a bounded thread pool,
+    so the event loop stays free to serve other requests while an analysis is running.
+    Torch releases the GIL inside its kernels, hence threads are enough to keep the loop responsive.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = settings.max_workers,
+        max_queue: int = settings.max_queue,
+        torch_threads: int | None = settings.torch_threads,
+    ):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        # the cores are split between the server processes, rather than oversubscribed
+        self.torch_threads = torch_threads or max(1, (os.cpu_count() or 1) // settings.processes)
+        # torch's intra-op thread count is process-wide: a budget shared by all `max_workers` threads, not per thread
+        torch.set_num_threads(self.torch_threads)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+        self._lock = threading.Lock()
+        self._running = 0
+        self._queued = 0
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "running": self._running,
+            "queued": self._queued,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "torch_threads": self.torch_threads,
+        }
+
+    async def __call__(self, f: Callable[P, T], *args: P.args, **kwargs: P.kwargs) -> T:
+        if self._running + self._queued >= self.max_workers + self.max_queue:
+            raise ExecutorSaturatedError()
+
+        def _run():
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+            try:
+                return f(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._running -= 1
+
+        with self._lock:
+            self._queued += 1
+        future = self._pool.submit(contextvars.copy_context().run, _run)  # e.g. the request id for logging
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            if future.cancelled():  # never picked up by a worker
+                with self._lock:
+                    self._queued -= 1
+            raise
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
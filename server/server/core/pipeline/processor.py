@@ -1,33 +1,123 @@
 import io
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import BinaryIO
 
 import df
 import torch
 import torchaudio
 
+from ...metrics import stage_seconds
+from ..registry import registry
+from .settings import settings
+
+TRIM_FRAME_MS = 25
+TRIM_HOP_MS = 10
+TRIM_FLOOR_DB = -50.0  # frames quieter than this (dBFS) are silence, whatever the rest of the recording
+TRIM_RANGE_DB = 40.0  # frames this much quieter than the loudest one are silence too
+TRIM_MARGIN_MS = 100  # kept around speech, so that soft onsets and endings are not clipped
+
+
+class AudioTooLongError(Exception):
+    def __init__(self, duration: float):
+        super().__init__(f"Audio is too long ({duration:.1f}s).")
+
+
+@lru_cache(maxsize=16)
+def resampler(source: int, target: int) -> torchaudio.transforms.Resample:
+    """Resampling module per pair of rates, its sinc kernel is only computed once."""
+    return torchaudio.transforms.Resample(source, target)
+
+
+def resample(waveform: torch.Tensor, source: int, target: int) -> torch.Tensor:
+    return waveform if source == target else resampler(source, target)(waveform)
+
+
+def trim(waveform: torch.Tensor, sr: int) -> torch.Tensor:
+    """Trims silence on both ends of a `(1, samples)` waveform, based on the energy of short frames."""
+    frame, hop = sr * TRIM_FRAME_MS // 1000, sr * TRIM_HOP_MS // 1000
+    if waveform.shape[-1] < frame:
+        return waveform[:, :0]
+    frames = waveform[0].unfold(0, frame, hop)
+    energy = 10 * torch.log10(frames.square().mean(dim=-1).clamp_min(1e-10))  # dBFS
+    threshold = max(TRIM_FLOOR_DB, energy.max().item() - TRIM_RANGE_DB)
+    if not (active := (energy > threshold).nonzero()).numel():
+        return waveform[:, :0]
+    margin = sr * TRIM_MARGIN_MS // 1000
+    start = max(0, active[0].item() * hop - margin)
+    end = min(waveform.shape[-1], active[-1].item() * hop + frame + margin)
+    return waveform[:, start:end]
+
 
 class AudioProcessor:
     SR = 16_000  # 16kHz for Wav2Vec2
+    STAGES = ("decode", "denoise", "resample", "trim")
 
-    def __init__(self, use_df: bool = True):
+    def __init__(self, use_df: bool = True, max_duration: float = settings.max_duration_seconds):
         self._use_df = use_df
+        self.max_duration = max_duration
         if use_df:
-            self._df_model, self._df_state, _ = df.init_df()
-
-    def __call__(self, data: bytes) -> torch.Tensor | None:
-        waveform, sr = torchaudio.load(io.BytesIO(data))
-        # remove background noise (48kHz for DeepFilterNet)
-        if self._use_df and sr == self._df_state.sr():
-            waveform = df.enhance(self._df_model, self._df_state, waveform)
-        # resample if necessary
-        if sr != AudioProcessor.SR:
-            waveform = torchaudio.functional.resample(waveform, sr, AudioProcessor.SR)
-        # ensure waveform is mono
-        if waveform.shape[0] > 1:
-            waveform = waveform.mean(dim=0, keepdim=True)
-        # trim silence in both ends
-        waveform = torchaudio.functional.vad(waveform, AudioProcessor.SR)
-
-        waveform = waveform.squeeze()  # flatten to 1D tensor
+            registry.register("deepfilternet", AudioProcessor._load_df, warmup=AudioProcessor._warmup_df)
+        # cumulative per-stage timings, stages run on several executor threads
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._seconds: dict[str, float] = defaultdict(float)
+
+    @staticmethod
+    def _load_df():
+        model, state, _ = df.init_df()
+        return model, state
+
+    @staticmethod
+    def _warmup_df(loaded):
+        model, state = loaded
+        df.enhance(model, state, torch.randn(1, state.sr() // 2) * 0.01)
+
+    @contextmanager
+    def _stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            stage_seconds.observe(elapsed, name)
+            with self._lock:
+                self._seconds[name] += elapsed
+
+    def stats(self) -> dict[str, float]:
+        """Average milliseconds spent in every stage per processed recording."""
+        with self._lock:
+            calls = max(self._calls, 1)
+            return {"calls": self._calls, **{f"{s}_ms": self._seconds[s] / calls * 1000 for s in self.STAGES}}
+
+    def __call__(self, data: bytes | BinaryIO) -> torch.Tensor | None:
+        with self._lock:
+            self._calls += 1
+        with self._stage("decode"):
+            # uploads are read from their spooled file as is, without another copy
+            waveform, sr = torchaudio.load(io.BytesIO(data) if isinstance(data, bytes) else data)
+            # reject before any of the expensive stages
+            if (duration := waveform.shape[-1] / sr) > self.max_duration:
+                raise AudioTooLongError(duration)
+            # ensure waveform is mono, before anything else runs on every channel
+            if waveform.shape[0] > 1:
+                waveform = waveform.mean(dim=0, keepdim=True)
+        # remove background noise, at DeepFilterNet's own rate (48kHz) whatever the recording's
+        if self._use_df:
+            df_model, df_state = registry.get("deepfilternet")
+            with self._stage("resample"):
+                waveform, sr = resample(waveform, sr, df_state.sr()), df_state.sr()
+            with self._stage("denoise"):
+                waveform = df.enhance(df_model, df_state, waveform)
+        with self._stage("resample"):
+            waveform = resample(waveform, sr, AudioProcessor.SR)
+        with self._stage("trim"):
+            waveform = trim(waveform, AudioProcessor.SR)
+
+        waveform = waveform.squeeze(0)  # flatten to 1D tensor
         if waveform.numel() == 0:
             return None  # silence only
         return waveform
@@ -0,0 +1,31 @@
+from pathlib import Path
+from typing import Literal
+
+from pydantic import Field, model_validator
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    max_workers: int = Field(default=2, ge=1)  # analyses running CPU-heavy stages at once
+    max_queue: int = Field(default=32, ge=0)  # analyses allowed to wait for a free worker
+    torch_threads: int | None = Field(default=None, ge=1)  # for the process, shared by its workers, see `executor.py`
+    processes: int = Field(default=1, ge=1)  # server processes splitting the cores, see `server/serve.py`
+    max_batch: int = Field(default=4, ge=1)  # waveforms per wav2vec2 forward pass
+    max_wait_ms: float = Field(default=20, ge=0)  # how long a waveform may wait for others to join its batch
+    chunk_seconds: float = Field(default=20.0, gt=0)  # longer waveforms are run through wav2vec2 in windows
+    chunk_overlap_seconds: float = Field(default=2.0, gt=0)  # context shared by consecutive windows
+    max_duration_seconds: float = Field(default=120.0, gt=0)  # longer recordings are rejected
+    aligner_backend: Literal["torch", "int8", "onnx"] = "torch"  # see `backends.py`
+    onnx_path: Path = Path.home() / ".cache" / "yaplingo" / "wav2vec2.onnx"  # exported on first use
+
+    model_config = SettingsConfigDict(env_prefix="pipeline_")
+
+    @model_validator(mode="after")
+    def check_chunks(self) -> "Settings":
+        # windows must move forward, or chunked inference would never get past the first one
+        if self.chunk_overlap_seconds >= self.chunk_seconds:
+            raise ValueError("chunk_overlap_seconds must be less than chunk_seconds")
+        return self
+
+
+settings = Settings.model_validate({})
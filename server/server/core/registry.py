@@ -0,0 +1,155 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Callable
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+class ModelState(str, Enum):
+    PENDING = "pending"
+    LOADING = "loading"
+    READY = "ready"
+    FAILED = "failed"
+
+
+@dataclass(kw_only=True)
+class ModelEntry:
+    loader: Callable[[], Any]
+    warmup: Callable[[Any], None] | None = None
+    preload: bool = True
+    fork_safe: bool = True  # whether it still works in processes forked once it is loaded
+
+    state: ModelState = ModelState.PENDING
+    load_seconds: float | None = None
+    warmup_seconds: float | None = None
+    parameter_bytes: int | None = None
+    rss_delta_bytes: int | None = None  # approximate when models are loaded concurrently
+    future: Future = field(default_factory=Future)
+
+
+def _rss() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0  # not available outside of Linux
+
+
+def _parameter_bytes(value: Any) -> int:
+    if isinstance(value, torch.nn.Module):
+        tensors = [*value.parameters(), *value.buffers()]
+        return sum(t.numel() * t.element_size() for t in tensors)
+    if isinstance(value, (tuple, list)):
+        return sum(_parameter_bytes(v) for v in value)
+    # e.g. pipelines holding their models as attributes, only one level deep
+    attributes = vars(value).values() if hasattr(value, "__dict__") else []
+    return sum(_parameter_bytes(v) for v in attributes if isinstance(v, torch.nn.Module))
+
+
+class ModelRegistry:
+    """
+    Loads models on first use, or in the background right after startup, then runs a synthetic
+    warm-up inference so that the first real request doesn't pay the first-call overhead of torch.
+    """
+
+    def __init__(self):
+        self._entries: dict[str, ModelEntry] = {}
+        self._lock = threading.Lock()
+
+    def register(
+        self,
+        name: str,
+        loader: Callable[[], Any],
+        warmup: Callable[[Any], None] | None = None,
+        preload: bool = True,
+        fork_safe: bool = True,
+    ):
+        with self._lock:
+            entry = ModelEntry(loader=loader, warmup=warmup, preload=preload, fork_safe=fork_safe)
+            self._entries.setdefault(name, entry)
+
+    def get(self, name: str) -> Any:
+        """Returns the model, loading it in the calling thread or waiting for the background load."""
+        entry = self._entries[name]
+        if self._claim(entry):
+            self._load(name, entry)
+        return entry.future.result()
+
+    def load_in_background(self):
+        """Loads all preloaded models one after the other, so that memory deltas are attributable."""
+
+        def _load_all():
+            for name, entry in list(self._entries.items()):
+                if entry.preload and self._claim(entry):
+                    self._load(name, entry)
+
+        threading.Thread(target=_load_all, name="model-loader", daemon=True).start()
+
+    def load_shared(self, lazy: bool = False):
+        """
+        Loads the models that forked processes can share, in the calling thread, before forking them.
+        Their weights are then shared copy-on-write rather than loaded again by every process, see `server/serve.py`.
+        With `lazy`, models only loaded on first use are shared too.
+        """
+        for name, entry in list(self._entries.items()):
+            if (entry.preload or lazy) and entry.fork_safe and self._claim(entry):
+                self._load(name, entry)
+
+    @property
+    def failed(self) -> list[str]:
+        return [name for name, entry in self._entries.items() if entry.state == ModelState.FAILED]
+
+    @property
+    def ready(self) -> bool:
+        return all(entry.state == ModelState.READY for entry in self._entries.values() if entry.preload)
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        return {
+            name: {
+                "state": entry.state.value,
+                "load_seconds": entry.load_seconds,
+                "warmup_seconds": entry.warmup_seconds,
+                "parameter_bytes": entry.parameter_bytes,
+                "rss_delta_bytes": entry.rss_delta_bytes,
+            }
+            for name, entry in self._entries.items()
+        }
+
+    def _claim(self, entry: ModelEntry) -> bool:
+        with self._lock:
+            if entry.state != ModelState.PENDING:
+                return False
+            entry.state = ModelState.LOADING
+            return True
+
+    def _load(self, name: str, entry: ModelEntry):
+        try:
+            rss = _rss()
+            start = time.perf_counter()
+            model = entry.loader()
+            entry.load_seconds = time.perf_counter() - start
+            entry.rss_delta_bytes = _rss() - rss
+            entry.parameter_bytes = _parameter_bytes(model)
+            if entry.warmup is not None:
+                start = time.perf_counter()
+                with torch.inference_mode():
+                    entry.warmup(model)
+                entry.warmup_seconds = time.perf_counter() - start
+        except BaseException as e:
+            logger.exception("failed to load model %r", name)
+            entry.state = ModelState.FAILED
+            entry.future.set_exception(e)
+            return
+        logger.info("loaded model %r in %.2fs", name, entry.load_seconds)
+        entry.state = ModelState.READY
+        entry.future.set_result(model)
+
+
+registry = ModelRegistry()
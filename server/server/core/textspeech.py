@@ -1,12 +1,34 @@
 import asyncio
 import base64
+import hashlib
 import io
+import re
 from abc import ABC, abstractmethod
 from functools import partial
+from typing import AsyncIterator, Iterator, Protocol
 
+import httpx
 import soundfile
 from gtts import agTTS
 from kokoro import KPipeline
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+from ..metrics import stage_seconds
+from ..utils import LRUCache
+from .registry import registry
+
+
+class Settings(BaseSettings):
+    inline: bool = False  # return base64 data URLs instead of short URLs to the audio endpoint
+    memory_cache_bytes: int = 64 * 1024 * 1024
+
+    model_config = SettingsConfigDict(env_prefix="tts_")
+
+
+settings = Settings.model_validate({})
+
+MIMES = {"mp3": "audio/mpeg", "wav": "audio/wav"}
+MP3_COMPRESSION = 0.75  # about 48kbps at constant bitrate, plenty for speech
 
 
 def data_urlencode(data: bytes, mime: str) -> str:
@@ -14,54 +36,180 @@ def data_urlencode(data: bytes, mime: str) -> str:
     return f"data:{mime};base64,{encoded}"
 
 
+class AudioBackend(Protocol):
+    async def get_audio(self, key: str) -> bytes | None: ...
+
+    async def save_audio(self, key: str, data: bytes): ...
+
+
+class AudioCache:
+    """
+    Content-addressed cache of synthesized audio, stored as raw bytes: an in-memory LRU tier,
+    backed by an optional shared tier (the store) once attached.
+    """
+
+    def __init__(self, memory_bytes: int = settings.memory_cache_bytes):
+        self._memory: LRUCache[str, bytes] = LRUCache(memory_bytes, sizeof=len)
+        self._backend: AudioBackend | None = None
+
+    def attach(self, backend: AudioBackend):
+        self._backend = backend
+
+    @staticmethod
+    def key(engine: str, voice: str, speed: float, text: str, extension: str) -> str:
+        normalized = re.sub(r"\s+", " ", text).strip()
+        digest = hashlib.blake2b(f"{engine}\0{voice}\0{speed}\0{normalized}".encode("utf-8"), digest_size=16)
+        return f"{digest.hexdigest()}.{extension}"
+
+    async def get(self, key: str) -> bytes | None:
+        if (data := self._memory.get(key)) is not None:
+            return data
+        if self._backend is not None and (data := await self._backend.get_audio(key)) is not None:
+            self._memory.put(key, data)
+        return data
+
+    async def put(self, key: str, data: bytes):
+        self._memory.put(key, data)
+        if self._backend is not None:
+            await self._backend.save_audio(key, data)
+
+
+audio_cache = AudioCache()
+
+
 class BaseTextSpeech(ABC):
+    ENGINE: str
+    EXTENSION: str
+
+    def __init__(self, voice: str = "", speed: float = 1.0):
+        self.voice = voice
+        self.speed = speed
+
     @abstractmethod
-    async def __call__(self, text: str) -> str:
+    async def synthesize(self, text: str) -> bytes:
         raise NotImplementedError
 
+    async def synthesize_stream(self, text: str) -> AsyncIterator[bytes]:
+        """Yields the encoded audio as it is synthesized, engines that can't do better yield it all at once."""
+        yield await self.synthesize(text)
 
-class GoogleTextSpeech(BaseTextSpeech):
-    def __init__(self):
-        self._synthesize = partial(agTTS, lang="en", tld="us", slow=False)
+    def _key(self, text: str) -> str:
+        return AudioCache.key(self.ENGINE, self.voice, self.speed, text, self.EXTENSION)
+
+    async def stream(self, text: str) -> AsyncIterator[bytes]:
+        """Yields the audio of the text as it is synthesized, then caches it as a whole, see `__call__`."""
+        key = self._key(text)
+        if (data := await audio_cache.get(key)) is not None:
+            yield data
+            return
+        chunks = []
+        with stage_seconds.time("tts"):
+            async for chunk in self.synthesize_stream(text):
+                chunks.append(chunk)
+                yield chunk
+        await audio_cache.put(key, b"".join(chunks))
 
     async def __call__(self, text: str) -> str:
+        """Returns a URL to the audio of the text, synthesized only if not cached yet."""
+        key = self._key(text)
+        if (data := await audio_cache.get(key)) is None:
+            with stage_seconds.time("tts"):
+                data = await self.synthesize(text)
+            await audio_cache.put(key, data)
+        if settings.inline:
+            return data_urlencode(data, mime=MIMES[self.EXTENSION])
+        return f"/audio/{key}"
+
+    async def aclose(self):
+        pass
+
+
+class GoogleTextSpeech(BaseTextSpeech):
+    ENGINE = "google"
+    EXTENSION = "mp3"
+
+    def __init__(self, host: str | None = None):
+        super().__init__(voice="en-us")
+        # one long-lived client for all requests, keeping connections to the TTS API alive
+        self._client = httpx.AsyncClient(
+            http2=True,
+            timeout=httpx.Timeout(10.0),
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16, keepalive_expiry=60.0),
+        )
+        self._synthesize = partial(agTTS, lang="en", tld="us", slow=False, host=host, client=self._client)
+
+    async def synthesize(self, text: str) -> bytes:
         buffer = io.BytesIO()
         await self._synthesize(text).write_to_fp(buffer)
-        data = buffer.getvalue()
-        return data_urlencode(data, mime="audio/mpeg")
+        return buffer.getvalue()
+
+    async def aclose(self):
+        await self._client.aclose()
 
 
 class KokoroTextSpeech(BaseTextSpeech):
+    ENGINE = "kokoro"
+    EXTENSION = "mp3"
+    SPLIT_PATTERN = r"(?<=[.!?])\s+"  # a chunk per sentence, the first one is heard while the others are synthesized
+
     def __init__(self):
-        pipeline = KPipeline(
+        super().__init__(voice="af_heart", speed=1.0)
+        # unused unless feedback is spoken, hence only loaded on first use
+        registry.register("kokoro", KokoroTextSpeech._load, preload=False)
+
+    @staticmethod
+    def _load() -> KPipeline:
+        return KPipeline(
             repo_id="hexgrad/Kokoro-82M",
             lang_code="en-us",
         )
-        self._generator = partial(
-            pipeline,
-            split_pattern=None,
-            voice="af_heart",
-            speed=1.0,
+
+    @property
+    def _generator(self):
+        return partial(
+            registry.get("kokoro"),
+            split_pattern=KokoroTextSpeech.SPLIT_PATTERN,
+            voice=self.voice,
+            speed=self.speed,
         )
 
-    async def __call__(self, text: str) -> str:
-        def _synthesize():
-            generator = self._generator(text)
-            with io.BytesIO() as buffer:
-                _, _, audio = next(generator)  # only yields the first sentence
-                soundfile.write(
-                    buffer,
-                    audio,
-                    format="wav",
-                    samplerate=24_000,  # Kokoro's fixed sample rate
-                )
-                data = buffer.getvalue()
-                return data_urlencode(data, mime="audio/wav")
-
-        return await asyncio.to_thread(_synthesize)
+    def _synthesize(self, text: str) -> Iterator[bytes]:
+        # constant bitrate, a variable one only gets its header right once the whole audio is encoded
+        with (
+            io.BytesIO() as buffer,
+            soundfile.SoundFile(
+                buffer,
+                mode="w",
+                format="MP3",
+                samplerate=24_000,  # Kokoro's fixed sample rate
+                channels=1,
+                bitrate_mode="CONSTANT",
+                compression_level=MP3_COMPRESSION,
+            ) as encoder,
+        ):
+            sent = 0
+            for _, _, audio in self._generator(text):
+                encoder.write(audio)
+                # the encoder holds back a few frames, whatever it has written so far can be sent already
+                with buffer.getbuffer() as view:
+                    data, sent = bytes(view[sent:]), len(view)
+                if data:
+                    yield data
+            encoder.close()  # flushes the remaining frames
+            if data := buffer.getvalue()[sent:]:
+                yield data
+
+    async def synthesize(self, text: str) -> bytes:
+        return b"".join([chunk async for chunk in self.synthesize_stream(text)])
+
+    async def synthesize_stream(self, text: str) -> AsyncIterator[bytes]:
+        chunks = self._synthesize(text)
+        # blocking, one sentence at a time off the event loop
+        while (chunk := await asyncio.to_thread(next, chunks, None)) is not None:
+            yield chunk
 
 
 ktts = KokoroTextSpeech()
 gtts = GoogleTextSpeech()
 
-__all__ = ["ktts", "gtts"]
+__all__ = ["ktts", "gtts", "audio_cache", "MIMES"]
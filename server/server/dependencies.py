@@ -1,14 +1,19 @@
+import time
 from typing import Annotated
 
 import jwt
 from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from ulid import ULID
 
+from server.admission import AnalysisQueue as _AnalysisQueue
 from server.core import Yaplingo as _Yaplingo
 from server.repository import Repository as _Repository
 from server.repository.models import User
 from server.settings import settings
 from server.store import Store as _Store
+from server.store.pool import TranscriptPool as _TranscriptPool
+from server.utils import LRUCache
 
 
 async def yaplingo(request: Request) -> _Yaplingo:
@@ -23,24 +28,41 @@ async def store(request: Request) -> _Store:
     return request.app.state.store
 
 
+async def pool(request: Request) -> _TranscriptPool:
+    return request.app.state.pool
+
+
+async def analyses(request: Request) -> _AnalysisQueue:
+    return request.app.state.analyses
+
+
 Yaplingo = Annotated[_Yaplingo, Depends(yaplingo)]
 Repository = Annotated[_Repository, Depends(repository)]
 Store = Annotated[_Store, Depends(store)]
+TranscriptPool = Annotated[_TranscriptPool, Depends(pool)]
+AnalysisQueue = Annotated[_AnalysisQueue, Depends(analyses)]
 
 security = HTTPBearer(auto_error=False)  # handle errors ourselves
 Credentials = Annotated[HTTPAuthorizationCredentials | None, Depends(security)]
 
+_token_subjects: LRUCache[str, ULID] = LRUCache(settings.token_cache_size)  # validated token -> user id
+
 
 async def current_user(credentials: Credentials, repository: Repository) -> User:
     if credentials is None:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
-    try:
-        claims = jwt.decode(credentials.credentials, settings.secret, algorithms=["HS256"])
-    except jwt.PyJWTError:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid Token")
-    if (uid := claims.get("sub")) is None:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid Token")
-    # TODO: cache this to avoid database hit on every protected endpoint
+    token = credentials.credentials
+    if (uid := _token_subjects.get(token)) is None:
+        try:
+            claims = jwt.decode(token, settings.secret, algorithms=["HS256"], options={"require": ["sub"]})
+            uid = ULID.from_str(claims["sub"])
+        except (jwt.PyJWTError, ValueError):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid Token")
+        # valid for the token's remaining lifetime only
+        _token_subjects.put(token, uid, ttl=claims["exp"] - time.time() if "exp" in claims else None)
     if (user := await repository.get_user(uid)) is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User Not Found")
     return user
+
+
+CurrentUser = Annotated[User, Depends(current_user)]
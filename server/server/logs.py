@@ -0,0 +1,81 @@
+import logging
+import random
+import re
+import time
+from contextvars import ContextVar
+from typing import Literal
+
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from ulid import ULID
+
+from .metrics import request_seconds
+
+
+class Settings(BaseSettings):
+    level: Literal["DEBUG", "INFO", "WARNING", "ERROR"] = "INFO"
+    sample_rate: float = Field(default=0.01, ge=0, le=1)  # share of verbose debug records (e.g. prompts) logged
+
+    model_config = SettingsConfigDict(env_prefix="log_")
+
+
+settings = Settings.model_validate({})
+
+REQUEST_ID = re.compile(r"[\w.-]{1,64}", re.ASCII)  # anything else is replaced, it is echoed in a header
+
+# set per request, and carried over to its background tasks and executor threads along with the context
+request_id: ContextVar[str] = ContextVar("request_id", default="-")
+
+
+def sampled() -> bool:
+    """Whether to log a verbose debug record, e.g. whole prompts and completions."""
+    return random.random() < settings.sample_rate
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+        return True
+
+
+def configure():
+    handler = logging.StreamHandler()
+    handler.addFilter(RequestIdFilter())
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+    logger = logging.getLogger("server")
+    logger.addHandler(handler)
+    logger.setLevel(settings.level)
+
+
+class RequestMiddleware:
+    """
+    Assigns every request an id (the client's `X-Request-ID` if any), returned in the same header,
+    and records the time to respond by route.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        given = dict(scope["headers"]).get(b"x-request-id", b"").decode("latin-1")
+        token = request_id.set(given if REQUEST_ID.fullmatch(given) else str(ULID()))
+        start = time.perf_counter()
+        code = 500
+
+        async def _send(message: Message):
+            nonlocal code
+            if message["type"] == "http.response.start":
+                code = message["status"]
+                message.setdefault("headers", []).append((b"x-request-id", request_id.get().encode("latin-1")))
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                route = getattr(scope.get("route"), "path", "unmatched")
+                request_seconds.observe(time.perf_counter() - start, scope["method"], route, str(code))
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            request_id.reset(token)
@@ -2,31 +2,49 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, status
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import PlainTextResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from starlette.exceptions import HTTPException
 
+from server.admission import AnalysisQueue
 from server.core import Yaplingo
+from server.core.generators.feedback import feedback_cache
+from server.core.registry import registry
+from server.core.textspeech import audio_cache
+from server.logs import RequestMiddleware, configure
+from server.metrics import render
 from server.repository import Repository
-from server.routers import auth, echo
+from server.routers import audio, auth, echo
 from server.store import Store
+from server.store.pool import TranscriptPool
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     app.state.yaplingo = Yaplingo()
+    app.state.yaplingo.load_models()  # in the background, see `/health`
     app.state.repository = await Repository.create()
     app.state.store = await Store.create()
+    audio_cache.attach(app.state.store)
+    feedback_cache.attach(app.state.store)
+    app.state.repository.users.attach(app.state.store)
+    app.state.pool = TranscriptPool(app.state.store, app.state.yaplingo)
+    app.state.pool.start()
+    app.state.analyses = AnalysisQueue()
     yield
+    await app.state.pool.stop()
     await app.state.repository.dispose()
     await app.state.store.dispose()
+    await app.state.yaplingo.dispose()
 
 
+configure()
 app = FastAPI(lifespan=lifespan)
+app.add_middleware(RequestMiddleware)
 
 
 @app.exception_handler(HTTPException)
 def http_exception_handler(_, exc: HTTPException):
-    return PlainTextResponse(str(exc.detail), status_code=exc.status_code)
+    return PlainTextResponse(str(exc.detail), status_code=exc.status_code, headers=exc.headers)
 
 
 @app.exception_handler(RequestValidationError)
@@ -36,3 +54,23 @@ def request_validation_error_handler(_, exc: RequestValidationError):
 
 app.include_router(auth.router, prefix="/auth")
 app.include_router(echo.router, prefix="/echo")
+app.include_router(audio.router, prefix="/audio")
+
+
+@app.get("/health")
+async def health():
+    content = {
+        "ready": registry.ready,
+        "models": registry.stats(),
+        "pipeline": app.state.yaplingo.stats(),
+        "analyses": app.state.analyses.stats(),
+        "pool": app.state.pool.stats(),
+        "hasher": app.state.repository.hasher.stats(),
+    }
+    code = status.HTTP_200_OK if registry.ready else status.HTTP_503_SERVICE_UNAVAILABLE
+    return JSONResponse(content, status_code=code)
+
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
@@ -1,12 +1,13 @@
-from argon2 import PasswordHasher
-from argon2.exceptions import VerifyMismatchError
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlmodel import SQLModel, select
 from sqlmodel.ext.asyncio.session import AsyncSession
 from ulid import ULID
 
+from ..metrics import stage_seconds
 from ..schemas import UserCreation, UserCredentials
+from .cache import UserCache
+from .hasher import AsyncPasswordHasher, HasherSaturatedError
 from .models import User
 from .settings import settings
 
@@ -17,11 +18,11 @@ class EntityExistsError(Exception):
 
 
 class Repository:
-    _hasher = PasswordHasher()
-
     def __init__(self):
         self._engine = create_async_engine(str(settings.url), echo=False, future=True)
         self.session = async_sessionmaker(self._engine, class_=AsyncSession, expire_on_commit=False)
+        self.users = UserCache()
+        self.hasher = AsyncPasswordHasher()
 
     @classmethod
     async def create(cls):
@@ -31,35 +32,43 @@ class Repository:
         return self
 
     async def dispose(self):
+        self.hasher.shutdown()
         await self._engine.dispose()
 
     async def get_user(self, id: ULID) -> User | None:
-        async with self.session() as session:
-            user = await session.get(User, id)
+        if (user := await self.users.get(id)) is not None:
+            return user
+        with stage_seconds.time("postgres"):
+            async with self.session() as session:
+                user = await session.get(User, id)
+        if user is not None:
+            await self.users.put(user)
         return user
 
     async def check_user(self, credentials: UserCredentials) -> User | None:
-        async with self.session() as session:
-            query = select(User).where(User.name == credentials.name)
-            user = (await session.exec(query)).one_or_none()
-        if user is None:
-            return None
-        try:
-            self._hasher.verify(user.password, credentials.password)
-        except VerifyMismatchError:
+        # always from the database, the cached users have no password hash
+        if self.hasher.saturated:
+            raise HasherSaturatedError()  # reject before querying the database
+        with stage_seconds.time("postgres"):
+            async with self.session() as session:
+                query = select(User).where(User.name == credentials.name)
+                user = (await session.exec(query)).one_or_none()
+        if user is None or not await self.hasher.verify(user.password, credentials.password):
             return None
         return user
 
     async def create_user(self, data: UserCreation) -> User:
         # hash password before storing into database
-        data.password = self._hasher.hash(data.password)
+        data.password = await self.hasher.hash(data.password)
         # auto map UserCreate (DTO) to User (DO) model
         user = User.model_validate(data)
         # perform database operation
         try:
-            async with self.session() as session:
-                async with session.begin():
-                    session.add(user)
+            with stage_seconds.time("postgres"):
+                async with self.session() as session:
+                    async with session.begin():
+                        session.add(user)
         except IntegrityError:
             raise EntityExistsError()
+        await self.users.put(user)  # about to authenticate with its new token
         return user
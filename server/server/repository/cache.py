@@ -0,0 +1,41 @@
+from typing import Protocol
+
+from ulid import ULID
+
+from ..utils import LRUCache
+from .models import User
+from .settings import settings
+
+
+class UserBackend(Protocol):
+    async def get_user(self, uid: ULID) -> User | None: ...
+
+    async def save_user(self, user: User): ...
+
+
+class UserCache:
+    """
+    Read-through cache of users by id: a short-lived in-memory LRU tier, backed by an optional
+    shared tier (the store) once attached. Users are never updated once created, hence entries only expire.
+    Neither tier holds password hashes, authentication reads them from the database.
+    """
+
+    def __init__(self, maxsize: int = settings.user_cache_size, ttl: float = settings.user_cache_ttl):
+        self._memory: LRUCache[ULID, User] = LRUCache(maxsize, ttl=ttl)
+        self._backend: UserBackend | None = None
+
+    def attach(self, backend: UserBackend):
+        self._backend = backend
+
+    async def get(self, uid: ULID) -> User | None:
+        if (user := self._memory.get(uid)) is not None:
+            return user
+        if self._backend is not None and (user := await self._backend.get_user(uid)) is not None:
+            self._memory.put(uid, user)
+        return user
+
+    async def put(self, user: User):
+        # a copy, the caller may still need the hash of the user it holds
+        self._memory.put(user.id, user.model_copy(update={"password": ""}))
+        if self._backend is not None:
+            await self._backend.save_user(user)
@@ -0,0 +1,66 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from argon2 import PasswordHasher
+from argon2.exceptions import VerifyMismatchError
+
+from .settings import hasher_settings as settings
+
+
+class HasherSaturatedError(Exception):
+    def __init__(self):
+        super().__init__("Password hasher queue is full.")
+
+
+class AsyncPasswordHasher:
+    """
+    Runs Argon2 on a small bounded thread pool (it releases the GIL), so that bursts of logins
+    don't block the event loop. Calls beyond the pool and its queue are rejected right away.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = settings.max_workers or min(4, os.cpu_count() or 1),
+        max_queue: int = settings.max_queue,
+    ):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._hasher = PasswordHasher(
+            time_cost=settings.time_cost,
+            memory_cost=settings.memory_cost,
+            parallelism=settings.parallelism,
+        )
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="argon2")
+        self._pending = 0  # only touched from the event loop
+
+    @property
+    def saturated(self) -> bool:
+        return self._pending >= self.max_workers + self.max_queue
+
+    def stats(self) -> dict[str, int]:
+        return {"pending": self._pending, "max_workers": self.max_workers, "max_queue": self.max_queue}
+
+    async def _run(self, f, *args):
+        if self.saturated:
+            raise HasherSaturatedError()
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool, f, *args)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self._hasher.hash, password)
+
+    async def verify(self, hash: str, password: str) -> bool:
+        def _verify():
+            try:
+                return self._hasher.verify(hash, password)
+            except VerifyMismatchError:
+                return False
+
+        return await self._run(_verify)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
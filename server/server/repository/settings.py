@@ -1,11 +1,30 @@
-from pydantic import PostgresDsn
+from argon2 import DEFAULT_MEMORY_COST, DEFAULT_PARALLELISM, DEFAULT_TIME_COST
+from pydantic import Field, PostgresDsn
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
 class Settings(BaseSettings):
     url: PostgresDsn
 
+    user_cache_size: int = Field(default=10_000, ge=1)  # users kept in memory per worker
+    user_cache_ttl: float = Field(default=60.0, gt=0)  # seconds, bounds staleness across workers
+
     model_config = SettingsConfigDict(env_prefix="database_")
 
 
 settings = Settings.model_validate({})
+
+
+class HasherSettings(BaseSettings):
+    # Argon2 parameters, changing them only affects newly hashed passwords
+    time_cost: int = Field(default=DEFAULT_TIME_COST, ge=1)
+    memory_cost: int = Field(default=DEFAULT_MEMORY_COST, ge=8)  # KiB per hash
+    parallelism: int = Field(default=DEFAULT_PARALLELISM, ge=1)
+
+    max_workers: int | None = Field(default=None, ge=1)  # concurrent hashes, defaults to min(4, CPUs)
+    max_queue: int = Field(default=16, ge=0)  # waiting hashes before rejecting
+
+    model_config = SettingsConfigDict(env_prefix="hasher_")
+
+
+hasher_settings = HasherSettings.model_validate({})
@@ -0,0 +1,30 @@
+from fastapi import APIRouter, HTTPException, Response, status
+from fastapi.responses import StreamingResponse
+
+from server.core.textspeech import MIMES, audio_cache
+
+CHUNK_SIZE = 64 * 1024
+
+# audio is content-addressed by an unguessable hash, and shared between users: no authentication needed
+router = APIRouter()
+
+
+@router.get("/{key}")
+async def get_audio(key: str) -> Response:
+    extension = key.rpartition(".")[-1]
+    if extension not in MIMES or (data := await audio_cache.get(key)) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+    async def chunks():
+        view = memoryview(data)
+        for start in range(0, len(view), CHUNK_SIZE):
+            yield bytes(view[start : start + CHUNK_SIZE])
+
+    return StreamingResponse(
+        chunks(),
+        media_type=MIMES[extension],
+        headers={
+            "Content-Length": str(len(data)),
+            "Cache-Control": "public, max-age=86400, immutable",  # the content of a key never changes
+        },
+    )
@@ -6,11 +6,13 @@ from fastapi import APIRouter, Depends, HTTPException, status
 
 from server.dependencies import Repository, current_user
 from server.repository import EntityExistsError
+from server.repository.hasher import HasherSaturatedError
 from server.repository.models import User
 from server.schemas import UserCreation, UserCredentials, UserResponse
 from server.settings import settings
 
 TOKEN_TTL = timedelta(days=7)
+RETRY_AFTER = 1  # seconds, hashes take a fraction of a second each
 
 router = APIRouter()
 
@@ -21,18 +23,32 @@ def generate_token(user: User) -> str:
     return jwt.encode(claims, settings.secret, algorithm="HS256")
 
 
+def busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too Many Attempts",
+        headers={"Retry-After": str(RETRY_AFTER)},
+    )
+
+
 @router.post("/register", status_code=status.HTTP_201_CREATED)
 async def register(user_creation: UserCreation, repository: Repository):
     try:
         user = await repository.create_user(user_creation)
     except EntityExistsError:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="User Already Exists")
+    except HasherSaturatedError:
+        raise busy()
     return {"token": generate_token(user)}
 
 
 @router.post("/login")
 async def login(user_credentials: UserCredentials, repository: Repository):
-    if (user := await repository.check_user(user_credentials)) is None:
+    try:
+        user = await repository.check_user(user_credentials)
+    except HasherSaturatedError:
+        raise busy()
+    if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
     return {"token": generate_token(user)}
 
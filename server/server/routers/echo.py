@@ -1,67 +1,270 @@
 import asyncio
-from dataclasses import dataclass
+import hashlib
+import logging
+from tempfile import SpooledTemporaryFile
+from typing import BinaryIO
 
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Response, status
-from pydantic import Base64Bytes, BaseModel
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
+from pydantic import Base64Bytes, BaseModel, ValidationError
+from starlette.datastructures import UploadFile
+from starlette.types import Message
 from ulid import ULID
 
-from server.core import Result, Transcripts
-from server.dependencies import Store, Yaplingo, current_user
+from server.admission import AdmissionError, UserLimitError
+from server.core import AudioTooLongError, ExecutorSaturatedError, Result, Transcripts
+from server.core.pipeline.settings import settings as pipeline_settings
+from server.core.textspeech import MIMES, ktts
+from server.dependencies import AnalysisQueue, CurrentUser, Store, TranscriptPool, Yaplingo, current_user
+from server.settings import settings
+from server.store import ResultModel, TaskError, TaskResult, TaskStatus
+
+logger = logging.getLogger(__name__)
+
+SPOOL_MEMORY_BYTES = 1024 * 1024  # larger uploads are spooled to disk
+
+
+class SupersededError(Exception):
+    pass
 
 
 class Echo(BaseModel):
     audio: Base64Bytes
 
 
-@dataclass(frozen=True, kw_only=True)
-class TaskResult:
-    pending: bool = True
-    result: Result | Exception | None = None
+def limit_body(request: Request, limit: int) -> Request:
+    """Returns the request with its body capped at `limit` bytes, whether or not a length was declared."""
+    if int(request.headers.get("content-length") or 0) > limit:
+        raise HTTPException(status_code=status.HTTP_413_CONTENT_TOO_LARGE)
+    received = 0
+
+    async def receive() -> Message:
+        nonlocal received
+        message = await request.receive()
+        if message["type"] == "http.request":
+            received += len(message.get("body", b""))
+            if received > limit:
+                raise HTTPException(status_code=status.HTTP_413_CONTENT_TOO_LARGE)
+        return message
+
+    return Request(request.scope, receive)
+
+
+async def read_audio(request: Request) -> bytes | BinaryIO:
+    """
+    Reads the recorded audio either as a raw `audio/*` body or an `audio` part of a multipart form,
+    streamed into a spooled file, or as a base64 `audio` field of a JSON body (kept for older clients).
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("application/json"):
+        body = await limit_body(request, settings.max_upload_bytes * 4 // 3 + 1024).body()
+        try:
+            return Echo.model_validate_json(body).audio
+        except ValidationError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid Request")
+    request = limit_body(request, settings.max_upload_bytes)
+    if content_type.startswith("audio/"):
+        file = SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+        async for chunk in request.stream():
+            file.write(chunk)
+        file.seek(0)
+        return file
+    if content_type.startswith("multipart/form-data"):
+        # closed along with the upload once the analysis is over
+        form = await request.form(max_files=1, max_fields=0)
+        if isinstance(audio := form.get("audio"), UploadFile):
+            return audio.file
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid Request")
+    raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+
+def audio_digest(tid: ULID, audio: bytes | BinaryIO) -> str:
+    """Identifies a submission, by its transcript and the content of its recording."""
+    digest = hashlib.blake2b(tid.bytes, digest_size=16)
+    if isinstance(audio, bytes):
+        digest.update(audio)
+    else:
+        while chunk := audio.read(SPOOL_MEMORY_BYTES):
+            digest.update(chunk)
+        audio.seek(0)
+    return digest.hexdigest()
+
+
+def close_audio(audio: bytes | BinaryIO | None):
+    """Closes the upload, if it was spooled or read from a form, once nothing reads it anymore."""
+    if audio is not None and not isinstance(audio, bytes):
+        audio.close()
+
+
+def rejected(exc: AdmissionError) -> HTTPException:
+    # a user over their own limit is told to slow down, anything else means the worker is busy
+    code = status.HTTP_429_TOO_MANY_REQUESTS if isinstance(exc, UserLimitError) else status.HTTP_503_SERVICE_UNAVAILABLE
+    return HTTPException(status_code=code, detail=str(exc), headers={"Retry-After": str(exc.retry_after)})
+
 
+def failed(task: TaskResult, analyses: AnalysisQueue) -> HTTPException:
+    # known failures caused by the recording are the client's, a busy worker is worth submitting again later
+    if task.error == TaskError.AUDIO_TOO_LONG:
+        detail = f"Audio is longer than {pipeline_settings.max_duration_seconds:.0f}s."
+        return HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_CONTENT, detail=detail)
+    if task.error == TaskError.BUSY:
+        headers = {"Retry-After": str(analyses.retry_after())}
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Analysis server is busy.", headers=headers
+        )
+    return HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-RESULTS: dict[ULID, TaskResult] = {}
 
 router = APIRouter(dependencies=[Depends(current_user)])
 
 
 @router.get("/transcripts")
-async def get_transcripts(yaplingo: Yaplingo, store: Store) -> Transcripts:
-    transcripts = await yaplingo.generate_transcripts()
-    asyncio.gather(*[store.save_transcript(item) for item in transcripts.items])
+async def get_transcripts(user: CurrentUser, pool: TranscriptPool, store: Store) -> Transcripts:
+    transcripts = await pool.pop(user.id)
+    # saved before responding, the client may post an attempt right away
+    await store.save_transcripts(transcripts.items)
     return transcripts
 
 
-@router.post("/{tid}", status_code=status.HTTP_201_CREATED)
+@router.post(
+    "/{tid}",
+    status_code=status.HTTP_201_CREATED,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "audio/*": {"schema": {"type": "string", "format": "binary"}},
+                "multipart/form-data": {
+                    "schema": {"type": "object", "properties": {"audio": {"type": "string", "format": "binary"}}}
+                },
+                "application/json": {"schema": Echo.model_json_schema()},
+            },
+        }
+    },
+)
 async def post_transcript(
     tid: ULID,
-    echo: Echo,
+    request: Request,
+    user: CurrentUser,
     yaplingo: Yaplingo,
     store: Store,
+    analyses: AnalysisQueue,
     background: BackgroundTasks,
 ) -> None:
     if (transcript := await store.get_transcript(tid)) is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    # before reading the upload, so that rejecting stays cheap
+    try:
+        admission = analyses.admit(user.id)
+    except AdmissionError as exc:
+        raise rejected(exc)
+    audio = None
+    try:
+        audio = await read_audio(request)
+        # hashing up to `max_upload_bytes`, possibly read back from disk, off the event loop
+        digest = await asyncio.to_thread(audio_digest, tid, audio)
+        # replace any previous result before responding, so that polling never picks up a stale one,
+        # unless it comes from the same recording (e.g. a retried upload), in which case it is reused as is
+        current = await store.claim_result(tid, TaskResult(digest=digest))
+    except BaseException:
+        admission.release()
+        close_audio(audio)
+        raise
+    if current is not None:
+        admission.release()
+        close_audio(audio)
+        logger.info("%s already submitted: %s", tid, current.status.value)
+        return
 
     async def analyze_audio():
-        RESULTS[tid] = TaskResult()
-        try:
-            result = await yaplingo.analyze_audio(echo.audio, transcript)
-        except Exception as e:
-            result = e
-        RESULTS[tid] = TaskResult(pending=False, result=result)
+        # runs after the response, still logged under the request's id
+        async with store.lease(tid), admission as queued:
+            logger.info("analyzing %s, queued for %.3fs", tid, queued)
+
+            async def publish(task_status: TaskStatus, **kwargs):
+                task = TaskResult(status=task_status, digest=digest, queued_seconds=queued, **kwargs)
+                if not await store.save_result(tid, task):
+                    raise SupersededError()
+
+            async def fail(error: TaskError | None = None):
+                # whether or not it was superseded meanwhile, there is nothing left to stop
+                task = TaskResult(status=TaskStatus.ERROR, error=error, digest=digest, queued_seconds=queued)
+                await store.save_result(tid, task)
+
+            try:
+                await publish(TaskStatus.PROCESSING)
+                if (pronunciation := await yaplingo.assess_pronunciation(audio, transcript)) is None:
+                    await publish(TaskStatus.DONE)
+                else:
+                    # publish the pronunciation right away, feedback generation may take a while
+                    await publish(TaskStatus.PRONOUNCED, pronunciation=pronunciation)
+                    feedback = await yaplingo.generate_feedback(transcript, pronunciation)
+                    await publish(TaskStatus.DONE, result=Result(feedback=feedback, pronunciation=pronunciation))
+                logger.info("analyzed %s", tid)
+            except SupersededError:
+                # another recording was submitted for the same transcript, stop working on this one
+                logger.info("analysis of %s superseded", tid)
+            except AudioTooLongError as exc:
+                logger.info("analysis of %s rejected: %s", tid, exc)
+                await fail(TaskError.AUDIO_TOO_LONG)
+            except ExecutorSaturatedError as exc:
+                logger.warning("analysis of %s rejected: %s", tid, exc)
+                await fail(TaskError.BUSY)
+            except Exception:
+                logger.exception("analysis of %s failed", tid)
+                await fail()
+            finally:
+                close_audio(audio)
 
     background.add_task(analyze_audio)
 
 
-@router.get("/{tid}/result")
-async def get_transcript_result(tid: ULID, response: Response, store: Store) -> Result | None:
+@router.get("/{tid}/result", response_model=Result | None)
+async def get_transcript_result(tid: ULID, store: Store, analyses: AnalysisQueue) -> Response:
+    if await store.get_transcript(tid) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    if (task := await store.get_result(tid)) is None or not task.status.finished:
+        raise HTTPException(status_code=status.HTTP_425_TOO_EARLY)
+    if task.status == TaskStatus.ERROR:
+        raise failed(task, analyses)
+    if task.result is None:
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+    # already validated when read from the store, skip re-validating it as the response model
+    return Response(ResultModel.dump_json(task.result), media_type="application/json")
+
+
+@router.get("/{tid}/events")
+async def stream_transcript_result(tid: ULID, store: Store) -> StreamingResponse:
+    """
+    Server-sent events pushing every stage of the analysis (`pending`, `processing`, `pronounced`, `done`, `error`),
+    as an alternative to polling the result endpoint. The stream ends once the result is finished.
+    """
+    if await store.get_transcript(tid) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+    async def events():
+        async for task in store.watch_result(tid):
+            if task is None:
+                yield ": heartbeat\n\n"
+            else:
+                yield f"event: {task.status.value}\ndata: {task.model_dump_json()}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/{tid}/feedback/audio")
+async def stream_feedback_audio(tid: ULID, store: Store, analyses: AnalysisQueue) -> StreamingResponse:
+    """Spoken feedback of the result, streamed as it is synthesized: the first sentence plays while the rest isn't."""
     if await store.get_transcript(tid) is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
-    if tid not in RESULTS or RESULTS[tid].pending:
+    if (task := await store.get_result(tid)) is None or not task.status.finished:
         raise HTTPException(status_code=status.HTTP_425_TOO_EARLY)
-    result = RESULTS[tid].result
-    if isinstance(result, Exception):
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
-    if result is None:
-        response.status_code = status.HTTP_204_NO_CONTENT
-    return result
+    if task.status == TaskStatus.ERROR:
+        raise failed(task, analyses)
+    if task.result is None:
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+    return StreamingResponse(ktts.stream(task.result.feedback.text), media_type=MIMES[ktts.EXTENSION])
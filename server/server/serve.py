@@ -0,0 +1,90 @@
+"""
+Serves the app from worker processes forked once the models are loaded, so that their weights are shared
+copy-on-write instead of being loaded again by every worker (`uvicorn --workers` spawns fresh interpreters).
+
+    uv run python -m server.serve --workers 4
+
+Dead workers are forked again from the loaded parent, which takes a fraction of a second.
+"""
+
+import argparse
+import gc
+import logging
+import os
+import signal
+import time
+
+import torch
+import uvicorn
+
+from server.core import Yaplingo
+from server.core.pipeline.settings import settings as pipeline_settings
+from server.core.registry import registry
+from server.main import app
+
+logger = logging.getLogger("server")
+
+RESTART_DELAY = 1.0  # seconds, so that a worker failing on startup doesn't spin
+STARTUP_FAILURE = 3  # same exit code as uvicorn's
+
+
+def fork(server: uvicorn.Server, sockets: list) -> int:
+    if pid := os.fork():
+        return pid
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, signal.SIG_DFL)  # until uvicorn installs its own
+    try:
+        server.run(sockets=sockets)
+    except BaseException:
+        logger.exception("worker %d failed", os.getpid())
+        os._exit(1)
+    os._exit(0 if server.started else STARTUP_FAILURE)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--lazy", action="store_true", help="also share models otherwise loaded on first use")
+    args = parser.parse_args()
+
+    # every worker gets its share of the cores for its inference threads
+    pipeline_settings.processes = args.workers
+    Yaplingo()  # registers the models, every worker creates its own once forked
+    # no OpenMP thread pool in the parent, it wouldn't survive the fork (after the executor set its own budget)
+    torch.set_num_threads(1)
+    registry.load_shared(lazy=args.lazy)
+    if failed := registry.failed:
+        raise SystemExit(f"failed to load {', '.join(failed)}")
+    # objects created so far are left alone by the garbage collector, which would otherwise copy their pages
+    gc.collect()
+    gc.freeze()
+
+    config = uvicorn.Config(app, host=args.host, port=args.port)
+    sockets = [config.bind_socket()]
+    workers = {fork(uvicorn.Server(config), sockets) for _ in range(args.workers)}
+    logger.info("forked %d workers", len(workers))
+
+    stopping = False
+
+    def stop(signum, _):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    while workers:
+        pid, status = os.wait()
+        workers.discard(pid)
+        if not stopping:
+            code = os.waitstatus_to_exitcode(status)
+            logger.warning("worker %d exited with code %d, forking another one", pid, code)
+            time.sleep(RESTART_DELAY)
+            workers.add(fork(uvicorn.Server(config), sockets))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,16 @@
+from pydantic import Field
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
     secret: str
+    token_cache_size: int = 10_000  # validated tokens kept in memory per worker
+    max_upload_bytes: int = 10 * 1024 * 1024  # recorded audio, before any base64 encoding
+
+    # analyses per worker, beyond which uploads are rejected with `Retry-After`
+    max_analyses: int = Field(default=4, ge=1)  # running at once, enough to fill a wav2vec2 batch
+    max_queued_analyses: int = Field(default=16, ge=0)  # waiting for a running slot
+    max_analyses_per_user: int = Field(default=2, ge=1)  # queued or running
 
 
 settings = Settings.model_validate({})
@@ -1,40 +1,333 @@
-from datetime import timedelta
-from typing import Awaitable, cast
+import asyncio
+import hashlib
+import json
+import re
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from typing import AsyncIterator, Awaitable, cast
 
-from pydantic import TypeAdapter
+from pydantic import BaseModel, TypeAdapter
+from redis.asyncio import BlockingConnectionPool
 from redis.asyncio import Redis as AsyncRedis
+from redis.exceptions import RedisError
 from ulid import ULID
 
-from ..core.generators.transcript import Transcript
+from ..core.generators.transcript import Transcript, Transcripts
+from ..core.pipeline import Pronunciation, Result
+from ..metrics import timed
+from ..repository.models import User
+from ..utils import LRUCache
 from .settings import settings
 
 TranscriptModel = TypeAdapter(Transcript)
+TranscriptsModel = TypeAdapter(Transcripts)
+ResultModel = TypeAdapter(Result)
 
 TRANSCRIPT_TTL = timedelta(hours=1)
+RESULT_TTL = TRANSCRIPT_TTL  # results are useless once their transcript has expired
+LEASE_TTL = timedelta(seconds=30)  # an unfinished result without its lease renewed belongs to a dead worker
+AUDIO_TTL = timedelta(days=1)  # refreshed on every read, always outlives the transcripts using it
+POOLED_TTL = AUDIO_TTL / 2  # pooled transcripts must not outlive their audio
+SEEN_TTL = timedelta(days=30)  # how long a learner is guaranteed not to see a sentence again
+USER_TTL = timedelta(minutes=10)
+FEEDBACK_TTL = timedelta(days=7)  # keys change along with the prompt, see `FeedbackGenerator.version`
+
+
+# results are versioned by the digest of the analyzed recording, see `Store.claim_result` and `Store.save_result`
+CLAIM_RESULT = """
+local current = redis.call("GET", KEYS[1])
+if current then
+    local task = cjson.decode(current)
+    local alive = task.status == "done" or (task.status ~= "error" and redis.call("EXISTS", KEYS[2]) == 1)
+    if task.digest == ARGV[1] and alive then
+        return current
+    end
+end
+redis.call("SET", KEYS[1], ARGV[2], "PX", ARGV[3])
+redis.call("SET", KEYS[2], 1, "PX", ARGV[4])
+redis.call("PUBLISH", KEYS[1], ARGV[2])
+return false
+"""
+SAVE_RESULT = """
+local current = redis.call("GET", KEYS[1])
+if current and cjson.decode(current).digest ~= ARGV[1] then
+    return 0
+end
+redis.call("SET", KEYS[1], ARGV[2], "PX", ARGV[3])
+redis.call("PUBLISH", KEYS[1], ARGV[2])
+return 1
+"""
+
+
+def fingerprint(text: str) -> str:
+    normalized = re.sub(r"\W+", " ", text.casefold()).strip()
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class TaskStatus(str, Enum):
+    PENDING = "pending"
+    PROCESSING = "processing"
+    PRONOUNCED = "pronounced"  # pronunciation is ready, feedback is not
+    DONE = "done"
+    ERROR = "error"
+
+    @property
+    def finished(self) -> bool:
+        return self in (TaskStatus.DONE, TaskStatus.ERROR)
+
+
+class TaskError(str, Enum):
+    """Why an analysis failed, when it is known, so that the client is told whether and how to try again."""
+
+    AUDIO_TOO_LONG = "audio_too_long"  # the recording itself is rejected, retrying it as is won't help
+    BUSY = "busy"  # the inference executor was saturated, the same recording may be submitted again later
+
+
+class TaskResult(BaseModel):
+    status: TaskStatus = TaskStatus.PENDING
+    error: TaskError | None = None  # only set when `ERROR`, unset for unexpected failures
+    digest: str | None = None  # of the submitted recording, identifies the version of the result
+    queued_seconds: float | None = None  # spent waiting for a running slot, set once `PROCESSING`
+    pronunciation: Pronunciation | None = None  # only set while `PRONOUNCED`
+    result: Result | None = None
 
 
 class Store:
     def __init__(self):
-        self._client = AsyncRedis.from_url(str(settings.url), decode_responses=True)
+        self._client = Store._connect(decode_responses=True)
+        self._binary_client = Store._connect()  # raw bytes, e.g. audio
+        # transcripts never change once saved, they only need to expire along with their key
+        self._transcripts: LRUCache[ULID, Transcript] = LRUCache(settings.transcript_cache_size)
+        self._claim_result = self._client.register_script(CLAIM_RESULT)
+        self._save_result = self._client.register_script(SAVE_RESULT)
+        # a single subscriber connection for all the watchers of the process, rather than one held per stream
+        self._pubsub = self._client.pubsub()
+        self._watchers: dict[str, set[asyncio.Queue]] = {}
+        self._listener: asyncio.Task | None = None
+        self._subscriptions = asyncio.Lock()  # the subscriber connection is only created on first use
+
+    @staticmethod
+    def _connect(decode_responses: bool = False) -> AsyncRedis:
+        # requests beyond `max_connections` wait for a connection to be released, rather than failing
+        pool = BlockingConnectionPool.from_url(
+            str(settings.url),
+            max_connections=settings.max_connections,
+            timeout=settings.pool_timeout,
+            decode_responses=decode_responses,
+        )
+        return AsyncRedis.from_pool(pool)  # closes the pool along with the client
 
     @classmethod
     async def create(cls):
         return cls()
 
     async def dispose(self):
+        if self._listener is not None:
+            self._listener.cancel()
+        await self._pubsub.aclose()
+        await self._binary_client.aclose()
         return await self._client.aclose()
 
     async def save_transcript(self, transcript: Transcript):
-        # `mode="json"` ensures `id: ULID` is serialized as a string
-        mapping = TranscriptModel.dump_python(transcript, mode="json")
-        hsetex = self._client.hsetex(
-            f"transcript:{str(transcript.id)}",
-            ex=TRANSCRIPT_TTL,
-            mapping=mapping,
-        )
-        await cast(Awaitable[int], hsetex)
+        await self.save_transcripts([transcript])
+
+    @timed("redis")
+    async def save_transcripts(self, transcripts: list[Transcript]):
+        """Saves all transcripts in a single round-trip."""
+        async with self._client.pipeline(transaction=True) as pipeline:
+            for transcript in transcripts:
+                # `mode="json"` ensures `id: ULID` is serialized as a string
+                mapping = TranscriptModel.dump_python(transcript, mode="json")
+                pipeline.hsetex(f"transcript:{str(transcript.id)}", ex=TRANSCRIPT_TTL, mapping=mapping)
+            await pipeline.execute()
+        for transcript in transcripts:
+            self._transcripts.put(transcript.id, transcript, ttl=TRANSCRIPT_TTL.total_seconds())
 
     async def get_transcript(self, tid: ULID) -> Transcript | None:
-        hgetall = self._client.hgetall(f"transcript:{str(tid)}")
-        mapping = await cast(Awaitable[dict], hgetall)
-        return TranscriptModel.validate_python(mapping) if mapping else None
+        if (transcript := self._transcripts.get(tid)) is not None:
+            return transcript
+        return await self._get_transcript(tid)
+
+    @timed("redis")
+    async def _get_transcript(self, tid: ULID) -> Transcript | None:
+        async with self._client.pipeline(transaction=False) as pipeline:
+            pipeline.hgetall(f"transcript:{str(tid)}")
+            pipeline.hpttl(f"transcript:{str(tid)}", "id")  # `HSETEX` expires the fields, not the key
+            mapping, [ttl] = await pipeline.execute()
+        if not mapping:
+            return None
+        transcript = TranscriptModel.validate_python(mapping)
+        if ttl > 0:  # cached only for as long as its fields live
+            self._transcripts.put(tid, transcript, ttl=ttl / 1000)
+        return transcript
+
+    @timed("redis")
+    async def save_audio(self, key: str, data: bytes):
+        await self._binary_client.set(f"audio:{key}", data, ex=AUDIO_TTL)
+
+    @timed("redis")
+    async def get_audio(self, key: str) -> bytes | None:
+        return await self._binary_client.getex(f"audio:{key}", ex=AUDIO_TTL)
+
+    @timed("redis")
+    async def save_user(self, user: User):
+        # the password hash is never needed past authentication, keep it out of the cache
+        data = user.model_dump_json(exclude={"password"})
+        await self._client.set(f"user:{str(user.id)}", data, ex=USER_TTL)
+
+    @timed("redis")
+    async def get_user(self, uid: ULID) -> User | None:
+        if (data := await self._client.get(f"user:{str(uid)}")) is None:
+            return None
+        return User.model_validate(json.loads(data), update={"password": ""})
+
+    @timed("redis")
+    async def save_feedback(self, key: str, text: str):
+        await self._client.set(f"feedback:{key}", text, ex=FEEDBACK_TTL)
+
+    @timed("redis")
+    async def get_feedback(self, key: str) -> str | None:
+        return await self._client.get(f"feedback:{key}")
+
+    @timed("redis")
+    async def count_pooled_transcripts(self, topic: str) -> int:
+        return await cast(Awaitable[int], self._client.llen(f"pool:{topic}"))
+
+    @timed("redis")
+    async def push_pooled_transcripts(self, transcripts: Transcripts):
+        data = TranscriptsModel.dump_json(transcripts)
+        await cast(Awaitable[int], self._client.rpush(f"pool:{transcripts.topic}", data))
+
+    async def pop_pooled_transcripts(self, topic: str, uid: ULID) -> Transcripts | None:
+        """
+        Pops a ready set of transcripts of the given topic that the user has never seen any sentence of.
+        Sets already seen by the user are put back at the end of the pool for other users.
+        """
+        key = f"pool:{topic}"
+        for _ in range(await self.count_pooled_transcripts(topic)):
+            if (data := await cast(Awaitable[str | None], self._client.lpop(key))) is None:
+                return None
+            transcripts = TranscriptsModel.validate_json(data)
+            if datetime.now(timezone.utc) - transcripts.items[0].id.datetime > POOLED_TTL:
+                continue  # drop stale sets
+            fingerprints = [fingerprint(item.text) for item in transcripts.items]
+            seen = self._client.smismember(f"seen:{str(uid)}", fingerprints)
+            if not any(await cast(Awaitable[list[int]], seen)):
+                return transcripts
+            await cast(Awaitable[int], self._client.rpush(key, data))
+        return None
+
+    @timed("redis")
+    async def mark_seen_transcripts(self, uid: ULID, transcripts: Transcripts):
+        fingerprints = [fingerprint(item.text) for item in transcripts.items]
+        async with self._client.pipeline(transaction=False) as pipeline:
+            pipeline.sadd(f"seen:{str(uid)}", *fingerprints)
+            pipeline.expire(f"seen:{str(uid)}", SEEN_TTL)
+            await pipeline.execute()
+
+    @timed("redis")
+    async def acquire_lock(self, name: str, ttl: timedelta) -> bool:
+        return bool(await self._client.set(f"lock:{name}", 1, nx=True, ex=ttl))
+
+    @timed("redis")
+    async def release_lock(self, name: str):
+        await self._client.delete(f"lock:{name}")
+
+    @timed("redis")
+    async def claim_result(self, tid: ULID, task: TaskResult) -> TaskResult | None:
+        """
+        Replaces the result with `task`, a new version, unless the same recording was already submitted:
+        its result is returned instead, whether still in progress or done, so that it is analyzed only once.
+        Failed results are replaced, resubmitting is how their analysis is retried, and so are unfinished ones
+        whose lease expired, see `lease`.
+        """
+        ttl, lease_ttl = int(RESULT_TTL.total_seconds() * 1000), int(LEASE_TTL.total_seconds() * 1000)
+        keys = [f"result:{str(tid)}", f"lease:{str(tid)}"]
+        args = [task.digest, task.model_dump_json(), ttl, lease_ttl]
+        data = await self._claim_result(keys=keys, args=args)
+        return TaskResult.model_validate_json(data) if data else None
+
+    @timed("redis")
+    async def save_result(self, tid: ULID, task: TaskResult) -> bool:
+        """Saves the result and notifies watchers on every worker, unless a newer version superseded it."""
+        ttl = int(RESULT_TTL.total_seconds() * 1000)
+        keys, args = [f"result:{str(tid)}"], [task.digest, task.model_dump_json(), ttl]
+        return bool(await self._save_result(keys=keys, args=args))
+
+    @asynccontextmanager
+    async def lease(self, tid: ULID):
+        """
+        Renews the lease of a claimed result while its analysis is running. Should the worker die,
+        the lease expires within `LEASE_TTL` and the next submission of the recording takes the result over.
+        """
+
+        async def renew():
+            while True:
+                await asyncio.sleep(LEASE_TTL.total_seconds() / 3)
+                try:
+                    await self._client.set(f"lease:{str(tid)}", 1, px=LEASE_TTL)
+                except RedisError:
+                    continue  # the next renewal may still make it in time
+
+        task = asyncio.create_task(renew())
+        try:
+            yield
+        finally:
+            task.cancel()
+
+    @timed("redis")
+    async def get_result(self, tid: ULID) -> TaskResult | None:
+        data = await self._client.get(f"result:{str(tid)}")
+        return TaskResult.model_validate_json(data) if data else None
+
+    async def watch_result(self, tid: ULID, heartbeat: float = 15.0) -> AsyncIterator[TaskResult | None]:
+        """
+        Yields the current state of the result, followed by every update until it is finished.
+        Yields `None` whenever nothing happened for `heartbeat` seconds, to keep connections alive.
+        """
+        channel, updates = f"result:{str(tid)}", asyncio.Queue()
+        # subscribe before reading the current state, so that no update can be missed in between
+        await self._subscribe(channel, updates)
+        try:
+            task = await self.get_result(tid)
+            if task is not None:
+                yield task
+            while task is None or not task.status.finished:
+                try:
+                    data = await asyncio.wait_for(updates.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                yield (task := TaskResult.model_validate_json(data))
+        finally:
+            await self._unsubscribe(channel, updates)
+
+    async def _subscribe(self, channel: str, queue: asyncio.Queue):
+        async with self._subscriptions:
+            queues = self._watchers.setdefault(channel, set())
+            queues.add(queue)
+            if len(queues) == 1:
+                await self._pubsub.subscribe(channel)
+            if self._listener is None or self._listener.done():
+                self._listener = asyncio.create_task(self._listen())
+
+    async def _unsubscribe(self, channel: str, queue: asyncio.Queue):
+        async with self._subscriptions:
+            queues = self._watchers.get(channel, set())
+            queues.discard(queue)
+            if not queues:
+                self._watchers.pop(channel, None)
+                await self._pubsub.unsubscribe(channel)
+
+    async def _listen(self):
+        """Dispatches the messages of the shared subscriber connection to the watchers, as long as there are any."""
+        while self._watchers:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except RedisError:
+                await asyncio.sleep(1.0)  # reconnects, and subscribes again, on the next read
+                continue
+            if message is not None:
+                for queue in self._watchers.get(message["channel"], ()):
+                    queue.put_nowait(message["data"])
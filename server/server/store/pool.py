@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import random
+import time
+from datetime import timedelta
+
+from ulid import ULID
+
+from ..core import Transcripts, Yaplingo
+from . import Store
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+REFILL_LOCK_TTL = timedelta(minutes=5)  # upper bound of generating a whole pool for one topic
+
+
+class TranscriptPool:
+    """
+    Keeps a pool of ready-to-serve transcript sets per topic in the store, so that requests
+    don't wait for the LLM, phonemization and speech synthesis. A background producer refills
+    every topic below the low-water mark up to the high-water mark; only one worker refills
+    a given topic at a time.
+    """
+
+    def __init__(
+        self,
+        store: Store,
+        yaplingo: Yaplingo,
+        low_water: int = settings.pool_low_water,
+        high_water: int = settings.pool_high_water,
+        interval: float = settings.pool_interval,
+    ):
+        self.low_water = low_water
+        self.high_water = high_water
+        self.interval = interval
+        self._store = store
+        self._yaplingo = yaplingo
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        # metrics
+        self.hits = 0
+        self.misses = 0
+        self.refills = 0
+        self.refill_lag = 0.0  # seconds from dropping below low-water to being refilled, last refill
+        self._drained_at: dict[str, float] = {}
+
+    def start(self):
+        self._task = asyncio.create_task(self._produce())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def stats(self) -> dict[str, float]:
+        requests = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / requests if requests else 0.0,
+            "refills": self.refills,
+            "refill_lag_seconds": self.refill_lag,
+        }
+
+    async def pop(self, uid: ULID) -> Transcripts:
+        topics = random.sample(self._yaplingo.topics, k=len(self._yaplingo.topics))
+        for topic in topics:
+            if (transcripts := await self._store.pop_pooled_transcripts(topic, uid)) is not None:
+                self.hits += 1
+                break
+        else:
+            self.misses += 1
+            transcripts = await self._yaplingo.generate_transcripts(topics[0])
+        self._wakeup.set()  # let the producer top up the pool
+        await self._store.mark_seen_transcripts(uid, transcripts)
+        return transcripts
+
+    async def _produce(self):
+        while True:
+            for topic in self._yaplingo.topics:
+                try:
+                    await self._refill(topic)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    logger.exception("failed to refill transcript pool for topic %r", topic)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _refill(self, topic: str):
+        count = await self._store.count_pooled_transcripts(topic)
+        if count >= self.low_water:
+            self._drained_at.pop(topic, None)
+            return
+        drained_at = self._drained_at.setdefault(topic, time.monotonic())
+        if not await self._store.acquire_lock(f"pool:{topic}", REFILL_LOCK_TTL):
+            return  # another worker is refilling this topic
+        try:
+            for _ in range(self.high_water - count):
+                await self._store.push_pooled_transcripts(await self._yaplingo.generate_transcripts(topic))
+        finally:
+            await self._store.release_lock(f"pool:{topic}")
+        self.refills += 1
+        self.refill_lag = time.monotonic() - drained_at
+        del self._drained_at[topic]
@@ -1,9 +1,16 @@
-from pydantic import RedisDsn
+from pydantic import Field, RedisDsn
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
 class Settings(BaseSettings):
     url: RedisDsn
+    max_connections: int = Field(default=128, ge=1)  # per client, result watchers each hold one while streaming
+    pool_timeout: float = Field(default=5.0, gt=0)  # seconds to wait for a free connection before failing
+    transcript_cache_size: int = Field(default=4096, ge=1)  # transcripts kept in memory per worker
+
+    pool_low_water: int = Field(default=2, ge=0)  # refill a topic once it has fewer ready transcript sets
+    pool_high_water: int = Field(default=5, ge=1)  # number of ready transcript sets to keep per topic
+    pool_interval: float = Field(default=5.0, gt=0)  # seconds between pool checks
 
     model_config = SettingsConfigDict(env_prefix="store_")
 
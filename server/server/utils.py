@@ -1,4 +1,10 @@
 import functools
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
 
 
 def cached_method(f):
@@ -12,3 +18,51 @@ def cached_method(f):
         return result
 
     return wrapper
+
+
+class LRUCache(Generic[K, V]):
+    """
+    In-process LRU cache, bounded by the total size of its values (`sizeof` defaults to counting items),
+    with an optional time-to-live in seconds for every entry.
+    """
+
+    def __init__(self, maxsize: int, ttl: float | None = None, sizeof: Callable[[V], int] = lambda _: 1):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._sizeof = sizeof
+        self._size = 0
+        self._items: OrderedDict[K, tuple[V, float]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: K) -> V | None:
+        if (item := self._items.get(key)) is None:
+            return None
+        value, expiration = item
+        if expiration < time.monotonic():
+            self.pop(key)
+            return None
+        self._items.move_to_end(key)
+        return value
+
+    def put(self, key: K, value: V, ttl: float | None = None):
+        self.pop(key)
+        if (size := self._sizeof(value)) > self.maxsize:
+            return  # would evict everything else
+        ttl = ttl if ttl is not None else self.ttl
+        self._items[key] = (value, time.monotonic() + ttl if ttl is not None else float("inf"))
+        self._size += size
+        while self._size > self.maxsize:
+            _, (evicted, _) = self._items.popitem(last=False)
+            self._size -= self._sizeof(evicted)
+
+    def pop(self, key: K) -> V | None:
+        if (item := self._items.pop(key, None)) is None:
+            return None
+        self._size -= self._sizeof(item[0])
+        return item[0]
+
+    def clear(self):
+        self._items.clear()
+        self._size = 0
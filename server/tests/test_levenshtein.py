@@ -0,0 +1,115 @@
+import random
+import tracemalloc
+
+import pytest
+
+from server.core.levenshtein import levenshtein
+
+PHONEMES = "p b t d k ɡ f v θ ð s z ʃ ʒ h m n ŋ l ɹ w j i ɪ e ɛ æ ə ʌ ɑ ɔ ʊ u aɪ aʊ oʊ eɪ ɔɪ ɚ".split()
+
+
+def reference(s1: list[str], s2: list[str]):
+    """The original implementation, a full list-of-lists matrix filled by nested loops."""
+    m, n = len(s1), len(s2)
+
+    dp = [[0] * (n + 1) for _ in range(m + 1)]
+    for i in range(m + 1):
+        dp[i][0] = i
+    for j in range(n + 1):
+        dp[0][j] = j
+
+    for i in range(1, m + 1):
+        for j in range(1, n + 1):
+            cost = 0 if s1[i - 1] == s2[j - 1] else 1
+            dp[i][j] = min(dp[i - 1][j - 1] + cost, dp[i - 1][j] + 1, dp[i][j - 1] + 1)
+
+    as1, as2, operations = [], [], []
+    i, j = m, n
+    while i > 0 or j > 0:
+        if i > 0 and j > 0:
+            cost = 0 if s1[i - 1] == s2[j - 1] else 1
+            if dp[i][j] == dp[i - 1][j - 1] + cost:
+                as1.append(s1[i - 1])
+                as2.append(s2[j - 1])
+                if cost == 1:
+                    operations.append(("~", i - 1, j - 1))
+                i -= 1
+                j -= 1
+                continue
+        if j > 0 and dp[i][j] == dp[i][j - 1] + 1:
+            as1.append("")
+            as2.append(s2[j - 1])
+            operations.append(("+", i, j - 1))
+            j -= 1
+            continue
+        if i > 0 and dp[i][j] == dp[i - 1][j] + 1:
+            as1.append(s1[i - 1])
+            as2.append("")
+            operations.append(("-", i - 1, j))
+            i -= 1
+            continue
+
+    as1.reverse()
+    as2.reverse()
+    operations.reverse()
+    return as1, as2, operations
+
+
+def mutate(sequence: list[str], rate: float, rng: random.Random) -> list[str]:
+    output = []
+    for phoneme in sequence:
+        r = rng.random()
+        if r < rate / 3:
+            continue
+        output.append(rng.choice(PHONEMES) if r < rate * 2 / 3 else phoneme)
+        if rng.random() < rate / 3:
+            output.append(rng.choice(PHONEMES))
+    return output
+
+
+def test_operations():
+    _, _, operations = levenshtein(list("kitten"), list("sitting"))
+    assert operations == [("~", 0, 0), ("~", 4, 4), ("+", 6, 6)]
+    assert levenshtein([], list("ab")) == (["", ""], ["a", "b"], [("+", 0, 0), ("+", 0, 1)])
+    assert levenshtein(list("ab"), []) == (["a", "b"], ["", ""], [("-", 0, 0), ("-", 1, 0)])
+
+
+@pytest.mark.parametrize("seed", range(500))
+def test_matches_reference(seed: int):
+    rng = random.Random(seed)
+    # small alphabets make ties between alignments, hence exercise the order in which operations are preferred
+    alphabet = PHONEMES[: rng.randint(1, len(PHONEMES))]
+    s1 = rng.choices(alphabet, k=rng.randint(0, 40))
+    if rng.random() < 0.5:
+        s2 = mutate(s1, rng.random(), rng)
+    else:
+        s2 = rng.choices(alphabet, k=rng.randint(0, 40))
+    assert levenshtein(s1, s2) == reference(s1, s2)
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_banded_matches_unbanded(seed: int):
+    rng = random.Random(seed)
+    s1 = rng.choices(PHONEMES, k=rng.randint(0, 120))
+    s2 = mutate(s1, rng.random() * 0.3, rng)
+    exact = levenshtein(s1, s2)
+    # the optimal alignment never strays from the diagonal by more than twice the distance
+    assert levenshtein(s1, s2, band=2 * len(exact[2]) + 1) == exact
+    # a narrower band still gives a valid alignment, never a better one
+    as1, as2, operations = levenshtein(s1, s2, band=rng.randint(0, 4))
+    assert [p for p in as1 if p] == s1 and [p for p in as2 if p] == s2
+    assert len(operations) >= len(exact[2])
+
+
+def test_banded_memory():
+    rng = random.Random(0)
+    s1 = rng.choices(PHONEMES, k=4000)
+    s2 = mutate(s1, 0.1, rng)
+    tracemalloc.start()
+    try:
+        levenshtein(s1, s2, band=16)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # the full matrix alone would take 4001 * 4000 * 2 bytes, about 32 MB
+    assert peak < 4 * 2**20